@@ -4,6 +4,7 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
+from string import Formatter
 from weakref import WeakSet
 
 from ..libs.miniboa import strip_caret_codes
@@ -84,6 +85,25 @@ class Channel:
                 for session in members:
                     self.members.add(session)
 
+    @property
+    def template(self):
+        """Return the message template for this channel."""
+        return self._template
+
+    @template.setter
+    def template(self, template):
+        """Set the message template for this channel.
+
+        A template that only uses {msg} is split into the text before and
+        after it here, so sending a message doesn't need to format it.
+
+        :param str template: A formatting string to use as a message template
+        :returns None:
+
+        """
+        self._template = template
+        self._parts = _split_template(template)
+
     def send(self, data, *more, sep=" ", context=None, members=None):
         """Send a message to a channel.
 
@@ -106,9 +126,35 @@ class Channel:
         if callable(members):
             members = members()
         message = joins(data, *more, sep=sep)
-        context = context or {}
-        message = self.template.format(msg=message, **context)
+        if self._parts and not context:
+            message = self._parts[0] + message + self._parts[1]
+        else:
+            context = context or {}
+            message = self.template.format(msg=message, **context)
         if self.logged:
             log.info(strip_caret_codes(message))
-        for session in members:
-            session.send(message)
+        from .sessions import SESSIONS
+        SESSIONS.broadcast(message, members)
+
+
+def _split_template(template):
+    """Split a template around its {msg} field.
+
+    :param str template: The template to split
+    :returns tuple: The text before and after the field, or None if the
+                    template has any other fields, conversions or specs
+
+    """
+    before = []
+    after = []
+    found = False
+    for text, field, spec, conversion in Formatter().parse(template):
+        (after if found else before).append(text)
+        if field is None:
+            continue
+        if found or field != "msg" or spec or conversion:
+            return None
+        found = True
+    if not found:
+        return None
+    return "".join(before), "".join(after)
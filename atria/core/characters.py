@@ -128,9 +128,10 @@ class Character(Entity):
                 context["t"] = target.name
                 context["ts"] = "s"
             msg = _build_msg(message, context)
-            for char in to:
-                if char is not self and char is not target:
-                    char.session.send(msg)
+            from .sessions import SESSIONS
+            SESSIONS.broadcast(msg, [char.session for char in to
+                                     if char is not self and
+                                     char is not target])
 
     def show_room(self, room=None):
         """Show a room's contents to the session controlling this character.
@@ -286,6 +287,12 @@ class CharacterRoom(Attribute):
                 old_value.chars.remove(char)
             if new_value:
                 new_value.chars.add(char)
+            # Anything that cares who is in a room only needs to hear about
+            # it once per pulse, no matter how many people come and go.
+            for room in (old_value, new_value):
+                if room:
+                    EVENTS.post("room_occupancy_changed", room,
+                                coalesce_key=room)
 
     @classmethod
     def _serialize(cls, value):
@@ -4,12 +4,15 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
+from weakref import ref
+
 from ..channels import CHANNELS
 from ..characters import CharacterShell
-from ..commands import Command, COMMANDS
-from ..entities import ENTITIES
+from ..commands import Command, COMMANDS, TIMING_BUCKETS
+from ..events import EVENTS
 from ..server import SERVER
-from ..storage import STORES
+from ..sessions import SESSIONS
+from ..snapshots import SNAPSHOTS
 from ..timing import duration_to_pulses, PULSE_PER_SECOND, TIMERS
 from ..world import Room
 
@@ -26,14 +29,57 @@ class AnnounceCommand(Command):
         CHANNELS["announce"].send(message)
 
 
+@COMMANDS.register
+class CommandStatsCommand(Command):
+
+    """A command to show which commands are taking the most time."""
+
+    def _action(self):
+        arg = self.args[0].lower() if self.args else None
+        if arg == "reset":
+            COMMANDS.reset_command_stats()
+            self.session.send("Command timing stats reset.")
+            return
+        stats = COMMANDS.get_command_stats()
+        if arg and not arg.isdigit():
+            # Show the histogram for one command.
+            for command, calls, total, most, buckets in stats:
+                if command.__name__.lower() == arg:
+                    break
+            else:
+                self.session.send("No timings for that command.")
+                return
+            self.session.send("^W{}^~: {} calls, {:.2f} ms total, "
+                              "{:.2f} ms max".format(command.__name__, calls,
+                                                     total * 1000,
+                                                     most * 1000))
+            bounds = ["<= {:g} ms".format(bound * 1000)
+                      for bound in TIMING_BUCKETS]
+            bounds.append("> {:g} ms".format(TIMING_BUCKETS[-1] * 1000))
+            for bound, bucket_calls in zip(bounds, buckets):
+                self.session.send("{:>12} {:>8}".format(bound, bucket_calls))
+            return
+        count = int(arg) if arg else 10
+        del stats[count:]
+        if not stats:
+            self.session.send("No commands have been timed.")
+            return
+        self.session.send("^W{:<28} {:>8} {:>10} {:>8} {:>8}^~".format(
+            "Command", "Calls", "Total ms", "Avg ms", "Max ms"))
+        for command, calls, total, most, buckets in stats:
+            self.session.send("{:<28} {:>8} {:>10.2f} {:>8.2f} {:>8.2f}"
+                              .format(command.__name__[:28], calls,
+                                      total * 1000, total / calls * 1000,
+                                      most * 1000))
+
+
 @COMMANDS.register
 class CommitCommand(Command):
 
     """A command to force a global store commit."""
 
     def _action(self):
-        ENTITIES.save()
-        STORES.commit()
+        SNAPSHOTS.save(background=False)
         self.session.send("Ok.")
 
 
@@ -60,6 +106,42 @@ class GotoCommand(Command):
             self.session.send("Syntax: goto (x),(y)[,z]")
 
 
+@COMMANDS.register
+class HookStatsCommand(Command):
+
+    """A command to profile event hooks and show the slowest ones."""
+
+    def _action(self):
+        arg = self.args[0].lower() if self.args else None
+        if arg in ("on", "off"):
+            EVENTS.profiling = arg == "on"
+            self.session.send("Hook profiling is now ", arg, ".", sep="")
+            return
+        if arg == "reset":
+            EVENTS.reset_hook_stats()
+            self.session.send("Hook profiling stats reset.")
+            return
+        try:
+            count = int(arg) if arg else 10
+        except ValueError:
+            self.session.send("Syntax: hookstats [on|off|reset|count]")
+            return
+        stats = EVENTS.get_hook_stats(count)
+        if not EVENTS.profiling:
+            self.session.send("Hook profiling is off.")
+        if not stats:
+            self.session.send("No hooks have been profiled.")
+            return
+        self.session.send("^W{:<20} {:<16} {:<24} {:>8} {:>10} {:>8}^~".format(
+            "Event", "Namespace", "Callback", "Calls", "Total ms", "Max ms"))
+        for event_name, namespace, callback, calls, total, most in stats:
+            name = getattr(callback, "__qualname__", None) or repr(callback)
+            self.session.send("{:<20} {:<16} {:<24} {:>8} {:>10.2f} {:>8.2f}"
+                              .format(event_name[:20], str(namespace)[:16],
+                                      name[:24], calls, total * 1000,
+                                      most * 1000))
+
+
 @COMMANDS.register
 class ReloadCommand(Command):
 
@@ -75,6 +157,19 @@ class ReloadCommand(Command):
         SERVER.reload()
 
 
+@COMMANDS.register
+class SessionStatsCommand(Command):
+
+    """A command to show how sessions are keeping up with their output."""
+
+    def _action(self):
+        stats = SESSIONS.stats
+        self.session.send("Sessions polled last pulse:", stats["polled"])
+        self.session.send("Sessions over their output budget:",
+                          stats["deferred"])
+        self.session.send("Total output deferrals:", stats["deferred_total"])
+
+
 @COMMANDS.register
 class ShutdownCommand(Command):
 
@@ -102,14 +197,24 @@ class ShutdownCommand(Command):
                 self.session.send("Shutdown initiated in",
                                   when // PULSE_PER_SECOND, "seconds!")
 
+            # The command only has its session while it executes, and the
+            # timer shouldn't keep the session alive if it closes first.
+            session_ref = ref(self.session)
+
             @TIMERS.create(when, "shutdown")
             def _shutdown():
-                self.session.send("Server is shutting down!")
+                session = session_ref()
+                if session:
+                    session.send("Server is shutting down!")
                 SERVER.shutdown()
 
 
 CharacterShell.add_verbs(AnnounceCommand, "announce")
+CharacterShell.add_verbs(CommandStatsCommand, "cmdstats", truncate=False)
 CharacterShell.add_verbs(CommitCommand, "commit", truncate=False)
 CharacterShell.add_verbs(GotoCommand, "go", "goto", truncate=False)
+CharacterShell.add_verbs(HookStatsCommand, "hookstats", truncate=False)
 CharacterShell.add_verbs(ReloadCommand, "reload", truncate=False)
+CharacterShell.add_verbs(SessionStatsCommand, "sessionstats",
+                         truncate=False)
 CharacterShell.add_verbs(ShutdownCommand, "shutdown", truncate=False)
@@ -10,6 +10,7 @@ from ..characters import CharacterShell
 from ..commands import Command, COMMANDS
 from ..sessions import SESSIONS
 from ..timing import TIMERS
+from ..utils.funcs import joins
 
 
 @COMMANDS.register
@@ -66,10 +67,14 @@ class WhoCommand(Command):
 
     def _action(self):
         chars = [session.char for session in SESSIONS.all()
-                 if session.char.active]
-        self.session.send("Players online:", len(chars))
-        for char in chars:
-            self.session.send("  ^W", char.name, "^~  ", char.title, sep="")
+                 if session.char and session.char.active]
+
+        def _lines():
+            yield joins("Players online:", len(chars))
+            for char in chars:
+                yield joins("  ^W", char.name, "^~  ", char.title, sep="")
+
+        self.session.page(_lines())
 
 
 CharacterShell.add_verbs(ExitsCommand, "exits", "ex")
@@ -4,19 +4,24 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
+from bisect import bisect_left
 from importlib import import_module
 from os import walk
 from os.path import join
 
-from .. import BASE_PACKAGE, ROOT_DIR
+from .. import BASE_PACKAGE, ROOT_DIR, settings
 from .events import EVENTS
 from .logs import get_logger
 from .utils.exceptions import AlreadyExists
-from .utils.mixins import HasFlags, HasFlagsMeta, HasWeaks, HasWeaksMeta
+from .utils.mixins import FlagSet, HasFlagsMeta, HasWeaksMeta
 
 
 log = get_logger("commands")
 
+# The upper bounds (in seconds) of the buckets in a command's histogram of
+# execution times; anything slower goes in one more bucket past the last.
+TIMING_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
 
 class CommandManager:
 
@@ -31,6 +36,9 @@ class CommandManager:
     def __init__(self):
         """Create a new command manager."""
         self._commands = {}
+        # Execution timings keyed by command class, each a list of
+        # [call count, total time, max time, histogram bucket counts].
+        self._command_stats = {}
 
     def __contains__(self, command):
         return self._get_name(command) in self._commands
@@ -66,45 +74,130 @@ class CommandManager:
         self._commands[name] = command
         return command
 
+    def record_timing(self, command, elapsed, args=None):
+        """Record how long a command took to execute.
+
+        If it took longer than settings.SLOW_COMMAND_TIME, it is also
+        logged along with the arguments it was given.
+
+        :param Command command: The command class that was executed
+        :param float elapsed: How long it took, in seconds
+        :param list args: Optional, the arguments it was executed with
+        :returns None:
+
+        """
+        stat = self._command_stats.get(command)
+        if stat is None:
+            stat = [0, 0.0, 0.0, [0] * (len(TIMING_BUCKETS) + 1)]
+            self._command_stats[command] = stat
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+        stat[3][bisect_left(TIMING_BUCKETS, elapsed)] += 1
+        if settings.SLOW_COMMAND_TIME and elapsed > settings.SLOW_COMMAND_TIME:
+            log.warn("Slow command %s took %.1fms with arguments: %r",
+                     command.__name__, elapsed * 1000, args)
+
+    def get_command_stats(self, count=None, sort_by="total"):
+        """Return the recorded timings of commands, most expensive first.
+
+        :param int count: Optional, the maximum number of commands to return
+        :param str sort_by: What to sort by; one of "count", "total", "max",
+                            or "average"
+        :returns list: A list of tuples in the form (command, call count,
+                       total time, max time, histogram), where histogram is
+                       a tuple of call counts for each of TIMING_BUCKETS
+                       and one more for anything slower
+        :raises ValueError: If `sort_by` is invalid
+
+        """
+        sort_keys = {
+            "count": lambda stat: stat[1],
+            "total": lambda stat: stat[2],
+            "max": lambda stat: stat[3],
+            "average": lambda stat: stat[2] / stat[1],
+        }
+        if sort_by not in sort_keys:
+            raise ValueError("invalid sort key: {}".format(sort_by))
+        stats = [(command, calls, total, most, tuple(buckets))
+                 for command, (calls, total, most, buckets)
+                 in self._command_stats.items()]
+        stats.sort(key=sort_keys[sort_by], reverse=True)
+        if count is not None:
+            del stats[count:]
+        return stats
+
+    def reset_command_stats(self):
+        """Clear all recorded timings of commands."""
+        self._command_stats.clear()
+
 
 class _CommandMeta(HasFlagsMeta, HasWeaksMeta):
-    # To avoid multiple metaclass errors.
-    pass
 
+    """A metaclass that keeps commands from having instance dictionaries.
+
+    Subclasses of Command are given empty slots unless they declare their
+    own, so any attributes they set on their instances need to be listed
+    in their __slots__.
+
+    """
 
-class Command(HasFlags, HasWeaks, metaclass=_CommandMeta):
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault("__slots__", ())
+        return super().__new__(mcs, name, bases, namespace)
 
-    """A command for performing actions through a shell."""
+
+class Command(metaclass=_CommandMeta):
+
+    """A command for performing actions through a shell.
+
+    A command is created for every line of input that runs one, so they
+    are kept light: they have slots rather than a __dict__ (subclasses
+    included, see _CommandMeta), the session is a plain attribute rather
+    than a weak reference (it is cleared once the command has executed,
+    so anything that outlives the command has to keep its own reference),
+    and an instance's flags aren't made until something asks for them.
+    Command classes can still be flagged like any other HasFlags class.
+
+    """
+
+    __slots__ = ("session", "args", "_flags", "__weakref__")
 
     # Whether this command receives its arguments un-parsed.
     no_parse = False
+    # How many pulses the session has to wait after this command before it
+    # can run another; call self.session.wait in _action to add more.
+    lag = 0
 
     def __init__(self, session, args):
         """Create a new command instance."""
-        super(Command, self).__init__()
         self.session = session
         self.args = args
 
     @property
-    def session(self):
-        """Return the current session for this command."""
-        return self._get_weak("session")
+    def flags(self):
+        """Return this command's flag set."""
+        try:
+            return self._flags
+        except AttributeError:
+            self._flags = FlagSet(self)
+            return self._flags
 
-    @session.setter
-    def session(self, new_session):
-        """Set the current session for this command.
-
-        :param Session new_session: The session tied to this command
-        :returns None:
-
-        """
-        self._set_weak("session", new_session)
+    # noinspection PyMethodMayBeStatic
+    def _flags_changed(self):
+        """Perform any callbacks for when the flag set has changed."""
 
     def execute(self):
         """Validate conditions and then perform this command's action."""
         if not self.session:
             return
-        self._action()
+        try:
+            self._action()
+            if self.lag:
+                self.session.wait(self.lag)
+        finally:
+            self.session = None
 
     # noinspection PyMethodMayBeStatic
     def _action(self):  # pragma: no cover
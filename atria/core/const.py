@@ -20,3 +20,33 @@ TRUST_BUILDER = 40
 TRUST_GM = 50
 TRUST_ADMIN = 60
 TRUST_OWNER = 70
+
+
+# Server loop phases, published to the nanny process for stall detection
+PHASE_BOOT = 0
+PHASE_MESSAGES = 1
+PHASE_LOOP_HOOKS = 2
+PHASE_TIMERS = 3
+PHASE_SOCKETS = 4
+PHASE_SESSIONS = 5
+PHASE_CLIENTS = 6
+PHASE_PRUNE = 7
+PHASE_PULSE = 8
+PHASE_RELOAD = 9
+PHASE_SHUTDOWN = 10
+PHASE_EVENTS = 11
+
+PHASE_NAMES = {
+    PHASE_BOOT: "boot",
+    PHASE_MESSAGES: "messages",
+    PHASE_LOOP_HOOKS: "loop hooks",
+    PHASE_TIMERS: "timers",
+    PHASE_SOCKETS: "sockets",
+    PHASE_SESSIONS: "sessions",
+    PHASE_CLIENTS: "clients",
+    PHASE_PRUNE: "prune",
+    PHASE_PULSE: "pulse",
+    PHASE_RELOAD: "reload",
+    PHASE_SHUTDOWN: "shutdown",
+    PHASE_EVENTS: "posted events",
+}
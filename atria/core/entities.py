@@ -5,10 +5,13 @@
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
 from copy import deepcopy
+from itertools import count, zip_longest
 from weakref import WeakValueDictionary
 
 from pylru import lrucache
 
+from .. import settings
+from .events import EVENTS
 from .logs import get_logger
 from .timing import TIMERS
 from .utils.exceptions import AlreadyExists
@@ -30,6 +33,10 @@ _uid_timecode_charset = ("0123456789aAbBcCdDeEfFgGhHijJkKLmM"
 # should generate eight-digit time codes with 100 microsecond precision until
 # October 25th, 2375, and then nine-digit codes well into the 26th millennium.
 
+# Every time an entity is dirtied it takes a new serial from this, so that
+# a background save can tell if an entity changed again while it was saving.
+_dirty_serials = count(1)
+
 
 # noinspection PyDocstring
 class _DataBlobMeta(HasWeaksMeta):
@@ -352,17 +359,102 @@ class EntityManager:
         self._entities[name] = entity
         return entity
 
-    def save(self):
-        """Save the dirty instances of all registered entities."""
-        count = 0
+    def get_dirty(self):
+        """Return a list of the dirty, savable instances of all entities.
+
+        :returns list: The instances that need to be saved
+
+        """
+        dirty = []
         for entity in self._entities.values():
             # noinspection PyProtectedMember
             for instance in entity._instances.values():
                 if instance.is_savable and instance.is_dirty:
-                    instance.save()
-                    count += 1
-        if count:
-            log.debug("Saved %s dirty entities.", count)
+                    dirty.append(instance)
+        return dirty
+
+    def save(self):
+        """Save the dirty instances of all registered entities."""
+        dirty = self.get_dirty()
+        for instance in dirty:
+            instance.save()
+        if dirty:
+            log.debug("Saved %s dirty entities.", len(dirty))
+
+    # noinspection PyProtectedMember
+    def get_hot_keys(self, limit=None):
+        """Return the keys of the entities most worth keeping loaded.
+
+        Active instances come first, followed by the keys in each entity's
+        key cache, from most to least recently used.
+
+        :param int limit: Optional, the maximum number of keys to return
+        :returns list: Pairs of entity names and keys, in priority order
+
+        """
+        hot_keys = []
+        seen = set()
+
+        def _add(name, key):
+            if key is Unset or (name, key) in seen:
+                return
+            seen.add((name, key))
+            hot_keys.append((name, key))
+
+        for name, entity in self._entities.items():
+            if not entity._store:
+                continue
+            for instance in entity._instances.values():
+                if instance.active and instance.is_savable:
+                    _add(name, instance.key)
+        # Take turns between entity types so none of them crowd out the
+        # others when there's a limit.
+        cached = []
+        for name, entity in self._entities.items():
+            cache = entity._caches.get(entity.get_key_name())
+            if entity._store and cache:
+                cached.append([(name, key) for key in cache.keys()])
+        for pairs in zip_longest(*cached):
+            for pair in pairs:
+                if pair is not None:
+                    _add(*pair)
+        if limit is not None:
+            del hot_keys[limit:]
+        return hot_keys
+
+    def prefetch(self, hot_keys, per_pulse=25):
+        """Load entities in the background, a few each pulse.
+
+        :param list hot_keys: Pairs of entity names and keys to load, in
+                              the order they should be loaded
+        :param int per_pulse: How many entities to load each pulse
+        :returns timing.Timer: The timer doing the loading, or None
+                               if there is nothing to load
+
+        """
+        if "prefetch_entities" in TIMERS:
+            TIMERS.kill("prefetch_entities")
+        remaining = [(name, key) for name, key in hot_keys
+                     if name in self._entities]
+        if not remaining:
+            return None
+        log.info("Prefetching %s entities.", len(remaining))
+        remaining.reverse()  # So we can pop them off the end in order.
+
+        def _prefetch():
+            for n in range(per_pulse):
+                if not remaining:
+                    timer.kill()
+                    log.debug("Prefetching entities complete.")
+                    return
+                name, key = remaining.pop()
+                entity = self._entities[name]
+                # Loading it puts it in the entity's key cache.
+                entity.load(key, default=None)
+
+        timer = TIMERS.create(1, "prefetch_entities", repeat=-1,
+                              save=False, callback=_prefetch)
+        return timer
 
 
 # noinspection PyDocstring
@@ -458,6 +550,10 @@ class Entity(HasFlags, HasTags, HasWeaks, metaclass=_EntityMeta):
     _store_key = "uid"
     _uid_code = "E"
 
+    # When a journal is recording changes, this will be an ordered dict that
+    # changed and deleted entities get noted in; see journal.Journal.
+    _changes = None
+
     __uid_timecode = 0  # Used internally for UID creation.
 
     def __init__(self, data=None, active=False, savable=True):
@@ -532,7 +628,7 @@ class Entity(HasFlags, HasTags, HasWeaks, metaclass=_EntityMeta):
     @property
     def is_dirty(self):
         """Return whether this entity is dirty and needs to be saved."""
-        return self._dirty
+        return bool(self._dirty)
 
     @property
     def is_savable(self):
@@ -556,7 +652,13 @@ class Entity(HasFlags, HasTags, HasWeaks, metaclass=_EntityMeta):
 
     def dirty(self):
         """Mark this entity as dirty so that it will be saved."""
-        self._dirty = True
+        self._dirty = next(_dirty_serials)
+        changes = Entity._changes
+        if changes is not None:
+            # Move it to the end, so the journal records this change after
+            # anything else that happened to it this pulse.
+            changes.pop(id(self), None)
+            changes[id(self)] = self
 
     def serialize(self):
         """Create a sanitized dict from the data on this entity.
@@ -753,6 +855,57 @@ class Entity(HasFlags, HasTags, HasWeaks, metaclass=_EntityMeta):
         else:
             return default
 
+    @classmethod
+    def load_many(cls, keys):
+        """Load a batch of entities, from storage if needed.
+
+        This works like calling load for each key with from_cache=True and
+        default=None, except that the _instances cache is only searched
+        once for the whole batch rather than once per key.
+
+        :param iterable keys: The keys the entities' data are stored under
+        :returns dict: The loaded entities, keyed by key; keys that weren't
+                       found are left out
+
+        """
+        key_name = cls.get_key_name()
+        cache = cls._caches.get(key_name)
+        found = {}
+        missing = []
+        for key in keys:
+            if key in found:
+                continue
+            if key_name == "uid" and key in cls._instances:
+                found[key] = cls._instances[key]
+            elif cache is not None and key in cache:
+                found[key] = cache[key]
+            else:
+                missing.append(key)
+        if missing and key_name != "uid":
+            by_key = {entity.key: entity
+                      for entity in cls._instances.values()}
+            keys, missing = missing, []
+            for key in keys:
+                if key in by_key:
+                    found[key] = by_key[key]
+                else:
+                    missing.append(key)
+        if missing and cls._store:
+            for key, data in cls._store.get_many(missing).items():
+                if not data:
+                    continue
+                if "uid" not in data:
+                    log.warn("No uid for %s loaded with key: %s!",
+                             class_name(cls), key)
+                entity = cls(data)
+                entity._dirty = False
+                found[key] = entity
+        if cache is not None:
+            for key, entity in found.items():
+                if key not in cache:
+                    cache[key] = entity
+        return found
+
     def save(self):
         """Store this entity."""
         if not self.is_savable:
@@ -804,6 +957,11 @@ class Entity(HasFlags, HasTags, HasWeaks, metaclass=_EntityMeta):
         """Delete this entity from its store."""
         if self._store:
             self._store.delete(self.key)
+            changes = Entity._changes
+            if changes is not None:
+                change = (class_name(self), self.key)
+                changes.pop(change, None)
+                changes[change] = None
 
 
 # We create a global EntityManager here for convenience, and while the
@@ -824,3 +982,14 @@ class EntityVersion(Attribute):
         if not isinstance(new_value, int):
             raise TypeError("entity version must be a number")
         return new_value
+
+
+@EVENTS.hook("server_save_state", "entities")
+def _hook_server_save_state(state):
+    state["hot_keys"] = ENTITIES.get_hot_keys(settings.PREFETCH_KEYS)
+
+
+@EVENTS.hook("server_load_state", "entities")
+def _hook_server_load_state(state):
+    if "hot_keys" in state:
+        ENTITIES.prefetch(state["hot_keys"], settings.PREFETCH_PER_PULSE)
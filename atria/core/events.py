@@ -4,6 +4,11 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import perf_counter
+
 from .logs import get_logger
 
 
@@ -25,6 +30,61 @@ class EventManager:
     def __init__(self):
         """Create a new event manager."""
         self._events = {}
+        self._profiling = False
+        # Hook timings while profiling, keyed by (event name, namespace,
+        # callback), each a list of [call count, total time, max time].
+        self._hook_stats = {}
+        # Events posted to be fired later, keyed by event name and coalesce
+        # key, or by a unique serial number if they don't coalesce.
+        self._posted = OrderedDict()
+        self._post_serials = count()
+        # Hooks indexed by namespace, each an ordered dict of hook to event.
+        self._namespaces = {}
+
+    @property
+    def profiling(self):
+        """Return whether hook calls are being profiled."""
+        return self._profiling
+
+    @profiling.setter
+    def profiling(self, value):
+        """Set whether hook calls are being profiled.
+
+        :param bool value: Whether to profile hook calls
+        :returns None:
+
+        """
+        self._profiling = bool(value)
+
+    def get_hook_stats(self, count=None, sort_by="max"):
+        """Return the profiled timings of hook calls, slowest first.
+
+        :param int count: Optional, the maximum number of hooks to return
+        :param str sort_by: What to sort by; one of "count", "total", "max",
+                            or "average"
+        :returns list: A list of tuples in the form (event name, namespace,
+                       callback, call count, total time, max time)
+        :raises ValueError: If `sort_by` is invalid
+
+        """
+        sort_keys = {
+            "count": lambda stat: stat[3],
+            "total": lambda stat: stat[4],
+            "max": lambda stat: stat[5],
+            "average": lambda stat: stat[4] / stat[3],
+        }
+        if sort_by not in sort_keys:
+            raise ValueError("invalid sort key: {}".format(sort_by))
+        stats = [key + tuple(values)
+                 for key, values in self._hook_stats.items()]
+        stats.sort(key=sort_keys[sort_by], reverse=True)
+        if count is not None:
+            del stats[count:]
+        return stats
+
+    def reset_hook_stats(self):
+        """Clear all profiled timings of hook calls."""
+        self._hook_stats.clear()
 
     def get_or_make(self, event_name):
         """Fetch an event, implicitly creating it if necessary.
@@ -40,7 +100,7 @@ class EventManager:
         return event
 
     def hook(self, event_name, namespace=None, callback=None,
-             pre=False, after=None):
+             pre=False, after=None, before=None):
         """Hook a callback to an event, optionally through a decorator.
 
         If an event with the name `event_name` does not exist it will be
@@ -49,44 +109,30 @@ class EventManager:
         If you do not provide `callback`, this will instead return a
         decorator that will use the decorated function as the callback.
 
+        Hooks are called in the order they were hooked, except where that
+        would break an `after` or `before` constraint.  Constraints naming
+        a namespace with no hooks on the event are ignored until it has one.
+
         :param str event_name: The name of the event to hook
         :param str namespace: Optional, a namespace for the hook
         :param function callback: Optional, a callback for the hook
         :param bool pre: Optional, whether to pre- or post-hook the event
-        :param str after: Optional, a namespace that this hook will be inserted
-                          after in the hook order
+        :param str|sequence after: Optional, one or more namespaces that this
+                                   hook must be called after
+        :param str|sequence before: Optional, one or more namespaces that
+                                    this hook must be called before
         :returns function|None: A decorator to register an event hook callback
                                 or None if callback was provided
+        :raises OverflowError: If the hook's constraints would create a cycle
 
         """
         def _inner(func):
             event = self.get_or_make(event_name)
-            new_hook = EventHook(func, namespace, pre, after)
-            event.hooks.append(new_hook)
+            new_hook = EventHook(func, namespace, pre, after, before)
+            event.add_hook(new_hook)
             if namespace is not None:
-                # Check for existing hooks that should be called after this.
-                moved = [new_hook]
-
-                def _check_afters(check_hooks):
-                    nonlocal moved
-                    move = []
-                    for hook in event.hooks:
-                        for check_hook in check_hooks:
-                            if (hook.after is not None and
-                                    hook.after == check_hook.namespace):
-                                move.append(hook)
-                    if move:
-                        for hook in move:
-                            if hook in moved:
-                                raise OverflowError(
-                                    "circular `after` attribute on"
-                                    " hook: {}".format(hook.after))
-                            event.hooks.remove(hook)
-                            event.hooks.append(hook)
-                            moved.append(hook)
-                        _check_afters(move)
-
-                _check_afters([new_hook])
+                owned = self._namespaces.setdefault(namespace, OrderedDict())
+                owned[new_hook] = event
             return func
 
         if callback:
@@ -111,8 +157,23 @@ class EventManager:
         :returns None:
 
         """
+        if namespace is not None:
+            # Only look at the hooks in that namespace.
+            owned = self._namespaces.get(namespace)
+            if not owned:
+                return
+            removing = OrderedDict()
+            for hook, event in owned.items():
+                if callback and hook.callback is not callback:
+                    continue
+                if not _match_event_name(event.name, event_name):
+                    continue
+                removing.setdefault(event, []).append(hook)
+            for event, hooks in removing.items():
+                self._remove_hooks(event, hooks)
+            return
         if event_name == "*":
-            events = self._events.values()
+            events = list(self._events.values())
         elif event_name.endswith("*"):
             events = [event for name, event in self._events.items()
                       if name.startswith(event_name[:-1])]
@@ -122,22 +183,44 @@ class EventManager:
             else:
                 events = []
         for event in events:
-            if callback and namespace is None:
+            if callback:
                 # Unhook by callback only.
-                event.hooks = [hook for hook in event.hooks
-                               if hook.callback is not callback]
-            elif namespace is not None:
-                # Unhook by namespace, with or without a callback.
-                if callback:
-                    event.hooks = [hook for hook in event.hooks
-                                   if hook.namespace != namespace or
-                                   hook.callback is not callback]
-                else:
-                    event.hooks = [hook for hook in event.hooks
-                                   if hook.namespace != namespace]
+                hooks = [hook for hook in event.registered_hooks
+                         if hook.callback is callback]
             else:
                 # Just unhook everything (not recommended).
-                event.hooks = []
+                hooks = event.registered_hooks
+            self._remove_hooks(event, hooks)
+
+    def _remove_hooks(self, event, hooks):
+        """Remove hooks from an event and the namespace index.
+
+        :param Event event: The event to remove the hooks from
+        :param sequence hooks: The hooks to remove
+        :returns None:
+
+        """
+        if not hooks:
+            return
+        event.remove_hooks(hooks)
+        for hook in hooks:
+            if hook.namespace is not None:
+                owned = self._namespaces[hook.namespace]
+                del owned[hook]
+                if not owned:
+                    del self._namespaces[hook.namespace]
+
+    def get_hooks(self, namespace):
+        """Return all the hooks in a namespace, across every event.
+
+        :param str namespace: The namespace to get the hooks for
+        :returns list: A list of tuples in the form (event name, hook)
+
+        """
+        owned = self._namespaces.get(namespace)
+        if not owned:
+            return []
+        return [(event.name, hook) for hook, event in owned.items()]
 
     def fire(self, event_name, *args, **opts):
         """Fire an event.
@@ -153,9 +236,82 @@ class EventManager:
         :returns EventContext: A context manager for the event
 
         """
-        event = self.get_or_make(event_name)
+        event = self._events.get(event_name)
+        if not event:
+            event = self.get_or_make(event_name)
+        if event.unsorted:
+            event.sort_hooks()
+        if not event.pre_callbacks and not event.post_callbacks:
+            # Nothing to call yet, though a post hook could still be hooked
+            # while the context is open.
+            return _HooklessEventContext(event, args, opts)
+        if self._profiling:
+            return _ProfiledEventContext(event, args, opts, self._hook_stats)
         return EventContext(event, args, opts)
 
+    def post(self, event_name, *args, coalesce_key=None):
+        """Queue an event to be fired when posted events are dispatched.
+
+        Posted events are fired in the order they were first posted.  If an
+        event is posted again with the same `coalesce_key` before it has been
+        dispatched, it will only be fired once, with the latest arguments.
+
+        Only use this for events whose hooks don't need to be called right
+        away; the hooks won't be able to affect whatever posted the event.
+
+        :param str event_name: The name of the event to post
+        :param sequence args: Optional, arguments passed to the event callbacks
+        :param hashable coalesce_key: Optional, a key to collapse duplicate
+                                      postings of this event with, such as
+                                      the subject of the event
+        :returns None:
+
+        """
+        if coalesce_key is None:
+            key = next(self._post_serials)
+        else:
+            key = (event_name, coalesce_key)
+        self._posted[key] = (event_name, args)
+
+    @property
+    def posted(self):
+        """Return the number of posted events waiting to be dispatched."""
+        return len(self._posted)
+
+    def dispatch_posted(self):
+        """Fire all the events that have been posted.
+
+        Events that are posted by hooks during this will be queued for the
+        next dispatch, rather than being fired now.
+
+        :returns int: The number of events fired
+
+        """
+        if not self._posted:
+            return 0
+        posted, self._posted = self._posted, OrderedDict()
+        for event_name, args in posted.values():
+            self.fire(event_name, *args).now()
+        return len(posted)
+
+
+def _match_event_name(name, pattern):
+    """Return whether an event name matches a possibly wildcard pattern."""
+    if pattern == "*":
+        return True
+    if pattern.endswith("*"):
+        return name.startswith(pattern[:-1])
+    return name == pattern
+
+
+def _as_tuple(namespaces):
+    """Return a tuple of namespaces from None, a string, or a sequence."""
+    if namespaces is None:
+        return ()
+    if isinstance(namespaces, str):
+        return (namespaces,)
+    return tuple(namespaces)
+
 
 class EventHook:
 
@@ -166,11 +322,15 @@ class EventHook:
 
     """
 
-    def __init__(self, callback, namespace=None, pre=False, after=None):
+    __slots__ = ("callback", "namespace", "pre", "after", "before")
+
+    def __init__(self, callback, namespace=None, pre=False,
+                 after=None, before=None):
         self.callback = callback
         self.namespace = namespace
         self.pre = pre
-        self.after = after
+        self.after = _as_tuple(after)
+        self.before = _as_tuple(before)
 
 
 class Event:
@@ -184,7 +344,177 @@ class Event:
 
     def __init__(self, name):
         self.name = name
-        self.hooks = []
+        self._registered = []  # In the order they were hooked.
+        self._hooks = ()  # In the order they will be called.
+        # Namespaces that are named in an `after` or `before` constraint.
+        self._constrained = set()
+        # Sorting is put off until the event is fired, so that hooking a lot
+        # of callbacks only sorts them once.
+        self.unsorted = False
+        # The callbacks are split out ahead of time so firing the event
+        # doesn't have to sort through the hooks every time.
+        self.pre_callbacks = ()
+        self.post_callbacks = ()
+
+    @property
+    def hooks(self):
+        """Return a tuple of this event's hooks, in the order they're called.
+
+        To change an event's hooks, assign a new sequence of hooks to this
+        rather than modifying it in place.
+
+        """
+        if self.unsorted:
+            self.sort_hooks()
+        return self._hooks
+
+    @hooks.setter
+    def hooks(self, new_hooks):
+        """Set this event's hooks.
+
+        :param sequence new_hooks: The new hooks, in the order they were
+                                   hooked; they will be sorted again
+        :returns None:
+
+        """
+        self._registered = list(new_hooks)
+        self._constrained = set()
+        for hook in self._registered:
+            self._constrained.update(hook.after, hook.before)
+        self.unsorted = True
+
+    @property
+    def registered_hooks(self):
+        """Return a tuple of this event's hooks, in the order they were hooked.
+
+        """
+        return tuple(self._registered)
+
+    def remove_hooks(self, hooks):
+        """Remove hooks from this event.
+
+        :param sequence hooks: The hooks to remove
+        :returns None:
+
+        """
+        removing = set(hooks)
+        if removing:
+            self.hooks = [hook for hook in self._registered
+                          if hook not in removing]
+
+    def _get_successors(self, hooks):
+        """Build a graph of which hooks need to be called after which.
+
+        :param sequence hooks: The hooks to build the graph from
+        :returns dict: A list of successors for each hook, by hook index
+
+        """
+        by_namespace = {}
+        for index, hook in enumerate(hooks):
+            if hook.namespace is not None:
+                by_namespace.setdefault(hook.namespace, []).append(index)
+        successors = {index: [] for index in range(len(hooks))}
+        for index, hook in enumerate(hooks):
+            for namespace in hook.after:
+                for other in by_namespace.get(namespace, ()):
+                    if other != index:
+                        successors[other].append(index)
+            for namespace in hook.before:
+                for other in by_namespace.get(namespace, ()):
+                    if other != index:
+                        successors[index].append(other)
+        return successors
+
+    def _find_cycle(self, hooks, start):
+        """Find a cycle of ordering constraints through a hook, if any.
+
+        :param sequence hooks: The hooks to check
+        :param int start: The index of the hook to look for a cycle through
+        :returns list: The hooks in the cycle, or None if there isn't one
+
+        """
+        successors = self._get_successors(hooks)
+        # An iterative depth-first search, tracking the path taken.
+        path = [start]
+        stack = [iter(successors[start])]
+        visited = {start}
+        while stack:
+            for index in stack[-1]:
+                if index == start:
+                    return [hooks[index] for index in path + [start]]
+                if index not in visited:
+                    visited.add(index)
+                    path.append(index)
+                    stack.append(iter(successors[index]))
+                    break
+            else:
+                stack.pop()
+                path.pop()
+        return None
+
+    def add_hook(self, new_hook):
+        """Add a hook to this event.
+
+        :param EventHook new_hook: The hook to add
+        :returns None:
+        :raises OverflowError: If the hook's constraints would create a cycle
+
+        """
+        hooks = self._registered + [new_hook]
+        # The existing hooks can't have a cycle, so any new one has to go
+        # through the new hook, and only if it's part of some constraint.
+        if (new_hook.after or new_hook.before or
+                new_hook.namespace in self._constrained):
+            cycle = self._find_cycle(hooks, len(hooks) - 1)
+            if cycle:
+                raise OverflowError(
+                    "circular hook order on event '{}': {}".format(
+                        self.name, " -> ".join(str(hook.namespace)
+                                               for hook in cycle)))
+        self._registered = hooks
+        self._constrained.update(new_hook.after, new_hook.before)
+        self.unsorted = True
+
+    def sort_hooks(self):
+        """Sort this event's hooks and rebuild its callbacks.
+
+        Hooks are topologically sorted by their ordering constraints, and
+        otherwise kept in the order they were hooked.
+
+        :returns None:
+
+        """
+        hooks = self._registered
+        if not self._constrained:
+            ordered = tuple(hooks)
+        else:
+            successors = self._get_successors(hooks)
+            in_degree = [0] * len(hooks)
+            for others in successors.values():
+                for other in others:
+                    in_degree[other] += 1
+            ready = [index for index, degree in enumerate(in_degree)
+                     if not degree]
+            heapify(ready)
+            order = []
+            while ready:
+                index = heappop(ready)
+                order.append(index)
+                for other in successors[index]:
+                    in_degree[other] -= 1
+                    if not in_degree[other]:
+                        heappush(ready, other)
+            if len(order) < len(hooks):
+                # This shouldn't happen, add_hook checks for cycles.
+                raise OverflowError("circular hook order on event"
+                                    " '{}'".format(self.name))
+            ordered = tuple(hooks[index] for index in order)
+        self._hooks = ordered
+        self.pre_callbacks = tuple(hook.callback for hook in ordered
+                                   if hook.pre)
+        self.post_callbacks = tuple(hook.callback for hook in ordered
+                                    if not hook.pre)
+        self.unsorted = False
 
 
 class EventContext:
@@ -195,24 +525,29 @@ class EventContext:
 
     """
 
+    __slots__ = ("event", "args", "no_pre", "no_post")
+
     def __init__(self, event_obj, args, opts):
         self.event = event_obj
         self.args = args
-        self.opts = opts
+        self.no_pre = opts.get("no_pre", False)
+        self.no_post = opts.get("no_post", False)
 
     def __enter__(self):
-        if not self.opts.get("no_pre"):
-            for hook in self.event.hooks:
-                if hook.pre:
-                    hook.callback(*self.args)
+        if not self.no_pre:
+            for callback in self.event.pre_callbacks:
+                callback(*self.args)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type or exc_val or exc_tb:
             return
-        if not self.opts.get("no_post"):
-            for hook in self.event.hooks:
-                if not hook.pre:
-                    hook.callback(*self.args)
+        if not self.no_post:
+            event = self.event
+            if event.unsorted:
+                # It was hooked while the context was open.
+                event.sort_hooks()
+            for callback in event.post_callbacks:
+                callback(*self.args)
 
     def now(self):
         """Enter and exit the context manually.
@@ -232,6 +567,65 @@ class EventContext:
         self.__exit__(None, None, None)
 
 
+class _ProfiledEventContext(EventContext):
+
+    """An event context that times each of its hook calls."""
+
+    __slots__ = ("stats",)
+
+    def __init__(self, event_obj, args, opts, stats):
+        super().__init__(event_obj, args, opts)
+        self.stats = stats
+
+    def _call_hooks(self, pre):
+        for hook in self.event.hooks:
+            if bool(hook.pre) is not pre:
+                continue
+            started = perf_counter()
+            try:
+                hook.callback(*self.args)
+            finally:
+                elapsed = perf_counter() - started
+                key = (self.event.name, hook.namespace, hook.callback)
+                stat = self.stats.get(key)
+                if stat is None:
+                    self.stats[key] = [1, elapsed, elapsed]
+                else:
+                    stat[0] += 1
+                    stat[1] += elapsed
+                    if elapsed > stat[2]:
+                        stat[2] = elapsed
+
+    def __enter__(self):
+        if not self.no_pre:
+            self._call_hooks(True)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type or exc_val or exc_tb:
+            return
+        if not self.no_post:
+            self._call_hooks(False)
+
+
+class _HooklessEventContext(EventContext):
+
+    """A context manager for an event that had no hooks when it was fired.
+
+    There is nothing to call on entering, and only post hooks that were
+    hooked while the context was open to call on exiting.
+
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def now(self):
+        """Do nothing, as nothing could have been hooked in the meantime."""
+        pass
+
+
 # We create a global EventManager here for convenience, and while the server
 # will generally only need one to work with, they are NOT singletons and you
 # can make more EventManager instances if you like.
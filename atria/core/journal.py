@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""An append-only journal of entity changes."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from collections import OrderedDict
+from os import listdir, makedirs, remove
+from os.path import exists, join, splitext
+import pickle
+import struct
+
+from .. import settings
+from .entities import ENTITIES, Entity
+from .logs import get_logger
+from .storage import STORES
+from .utils.funcs import class_name
+
+
+log = get_logger("journal")
+
+
+# Each batch of records is written as a pickled list prefixed by its length.
+_header = struct.Struct("!I")
+
+
+# noinspection PyProtectedMember
+class Journal:
+
+    """An append-only journal of changes to entities.
+
+    While a journal is open, every entity that is dirtied or deleted is noted,
+    and once per pulse those changes are serialized and appended to the
+    journal as one batch.  If the server process dies before the next
+    snapshot is saved, replaying the journal on the next boot brings the
+    stores back up to date.
+
+    The journal is split into numbered segment files so that a background
+    snapshot can rotate to a new segment when it forks and then throw away
+    the old ones once the changes in them have all been saved.
+
+    """
+
+    _extension = ".jnl"
+
+    def __init__(self, subpath="journal", entities=ENTITIES, stores=STORES):
+        """Create a new journal.
+
+        :param str subpath: The path under DATA_DIR to keep segments in
+        :param entities.EntityManager entities: The entities to journal
+        :param storage.DataStoreManager stores: The stores to commit replayed
+                                                changes to
+        :returns None:
+
+        """
+        self._path = join(settings.DATA_DIR, subpath)
+        self._entities = entities
+        self._stores = stores
+        self._file = None
+        self._segment = 0
+        # The segments this journal has written and not yet discarded.
+        self._segments = []
+
+    @property
+    def is_open(self):
+        """Return whether this journal is recording changes."""
+        return self._file is not None
+
+    def _get_segment_path(self, segment):
+        return join(self._path, "{:08d}{}".format(segment, self._extension))
+
+    def _get_segments(self):
+        """Return a sorted list of the segment numbers on disk."""
+        if not exists(self._path):
+            return []
+        segments = []
+        for name in listdir(self._path):
+            number, ext = splitext(name)
+            if ext == self._extension and number.isdigit():
+                segments.append(int(number))
+        return sorted(segments)
+
+    def _start_segment(self):
+        segments = self._get_segments()
+        if segments and segments[-1] > self._segment:
+            self._segment = segments[-1]
+        self._segment += 1
+        self._segments.append(self._segment)
+        self._file = open(self._get_segment_path(self._segment), "ab")
+
+    def open(self):
+        """Start recording changes to a new segment."""
+        if self._file is not None:
+            return
+        if not exists(self._path):
+            makedirs(self._path)
+        # Any segments already on disk were left by the process we reloaded
+        # from, so they're ours to discard once a snapshot has everything.
+        for segment in self._get_segments():
+            if segment not in self._segments:
+                self._segments.append(segment)
+        self._start_segment()
+        Entity._changes = OrderedDict()
+
+    def close(self):
+        """Write any pending changes and stop recording."""
+        if self._file is None:
+            return
+        self.flush()
+        Entity._changes = None
+        self._file.close()
+        self._file = None
+
+    def flush(self):
+        """Append all the changes since the last flush as one batch.
+
+        :returns int: The number of records written
+
+        """
+        changes = Entity._changes
+        if self._file is None or not changes:
+            return 0
+        Entity._changes = OrderedDict()
+        records = []
+        for change, instance in changes.items():
+            if instance is None:
+                # It was deleted.
+                name, key = change
+                records.append((name, key, None, None))
+            elif instance._dirty and instance.is_savable:
+                data = instance.serialize()
+                old_key = data["tags"].pop("_old_key", None)
+                records.append((class_name(instance), instance.key,
+                                old_key, data))
+        if records:
+            payload = pickle.dumps(records, pickle.HIGHEST_PROTOCOL)
+            self._file.write(_header.pack(len(payload)) + payload)
+            # We don't fsync here; the journal is meant to survive the server
+            # process crashing, and the OS has the data once it's flushed.
+            self._file.flush()
+        return len(records)
+
+    def rotate(self):
+        """Flush and start a new segment, returning the older segments.
+
+        :returns list: The numbers of the segments before the new one
+
+        """
+        if self._file is None:
+            return []
+        self.flush()
+        self._file.close()
+        self._start_segment()
+        return self._segments[:-1]
+
+    def discard(self, segments):
+        """Delete segments whose changes have all been saved.
+
+        :param iterable segments: The numbers of the segments to delete
+        :returns None:
+
+        """
+        for segment in list(segments):
+            path = self._get_segment_path(segment)
+            if exists(path):
+                remove(path)
+            if segment in self._segments:
+                self._segments.remove(segment)
+
+    def truncate(self):
+        """Throw away the whole journal after everything has been saved."""
+        if self._file is None:
+            return
+        # Anything that's still pending was just saved.
+        Entity._changes.clear()
+        self.discard(self.rotate())
+
+    def _read_segment(self, segment):
+        """Read the batches of records from a segment.
+
+        A crash while writing can leave a partial batch at the end of the last
+        segment; that batch never finished being written, so it's dropped.
+
+        :param int segment: The number of the segment to read
+        :returns iterator: The records in the segment
+
+        """
+        path = self._get_segment_path(segment)
+        with open(path, "rb") as segment_file:
+            while True:
+                header = segment_file.read(_header.size)
+                if not header:
+                    break
+                payload = None
+                if len(header) == _header.size:
+                    size = _header.unpack(header)[0]
+                    payload = segment_file.read(size)
+                    if len(payload) < size:
+                        payload = None
+                if payload is None:
+                    log.warning("Dropping incomplete batch at end of"
+                                " journal segment %s.", segment)
+                    break
+                yield from pickle.loads(payload)
+
+    def replay(self):
+        """Apply the journaled changes to the stores and commit them.
+
+        This should be done before anything has been loaded from the stores,
+        and before the journal is opened.
+
+        :returns int: The number of records replayed
+
+        """
+        segments = self._get_segments()
+        if not segments:
+            return 0
+        count = 0
+        for segment in segments:
+            for name, key, old_key, data in self._read_segment(segment):
+                if name not in self._entities:
+                    log.warning("Skipping journaled change to unknown"
+                                " entity type %s.", name)
+                    continue
+                store = self._entities[name]._store
+                if old_key is not None and store.has(old_key):
+                    store.delete(old_key)
+                if data is None:
+                    if store.has(key):
+                        store.delete(key)
+                else:
+                    store.put(key, data)
+                count += 1
+        self._stores.commit()
+        self._segment = segments[-1]
+        self.discard(segments)
+        log.info("Replayed %s journaled changes from %s segments.",
+                 count, len(segments))
+        return count
+
+
+# We create a global Journal here for convenience, and while the server will
+# generally only need one to work with, they are NOT singletons and you can
+# make more Journal instances if you like.
+JOURNAL = Journal()
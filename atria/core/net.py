@@ -51,12 +51,19 @@ class ClientManager:
         :returns miniboa.TelnetClient: A matching client or None
 
         """
-        for client in self.clients.values():
-            if client.port == port:
-                return client
+        if self._server:
+            return self._server.clients.ports.get(port)
+
+    def get_port_map(self):
+        """Return a dict of this manager's clients keyed by their ports.
+
+        :returns dict: The clients, keyed by port
+
+        """
+        return dict(self._server.clients.ports) if self._server else {}
 
     def listen(self, address, port, on_connect, on_disconnect,
-               server_socket=None):
+               server_socket=None, on_receive=None):
         """Start a new telnet server to listen for connections.
 
         This will discard any existing listener server, likely dropping any
@@ -69,6 +76,8 @@ class ClientManager:
         :param fd server_socket: The fileno of an existing listener socket to
                                  listen with; if None, a new listener will be
                                  opened; if 0, no listener is used
+        :param callable on_receive: Optional, a callback for when a client
+                                    has received a full line of input
         :returns None:
         :raises TypeError: If `on_connect` or `on_disconnect` aren't callable
 
@@ -88,7 +97,9 @@ class ClientManager:
                                     timeout=0,
                                     on_connect=on_connect,
                                     on_disconnect=on_disconnect,
-                                    server_socket=server_socket)
+                                    server_socket=server_socket,
+                                    on_receive=on_receive)
+        self._server.clients = _ClientMap()
 
     def close(self):
         """Stop the telnet server."""
@@ -105,6 +116,46 @@ class ClientManager:
             self._server.poll()
 
 
+class _ClientMap(dict):
+
+    """A dict of clients keyed by fileno, that also indexes them by port.
+
+    The telnet server adds and removes its clients itself, so this keeps the
+    port index in step with it without the server needing to know.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ports = {}
+
+    def __setitem__(self, fileno, client):
+        if fileno in self:
+            self._unindex(self[fileno])
+        super().__setitem__(fileno, client)
+        self.ports[client.port] = client
+
+    def __delitem__(self, fileno):
+        client = self[fileno]
+        super().__delitem__(fileno)
+        self._unindex(client)
+
+    def _unindex(self, client):
+        if self.ports.get(client.port) is client:
+            del self.ports[client.port]
+
+    def pop(self, fileno, *default):
+        if fileno not in self:
+            return super().pop(fileno, *default)
+        client = super().pop(fileno)
+        self._unindex(client)
+        return client
+
+    def clear(self):
+        super().clear()
+        self.ports.clear()
+
+
 # We create a global ClientManager here for convenience, and while the server
 # will generally only need one to work with, they are NOT singletons and you
 # can make more ClientManager instances if you like.
@@ -4,7 +4,7 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
-from os import listdir, makedirs, remove
+from os import getpid, listdir, makedirs, remove, replace
 from os.path import abspath, exists, join, splitext
 import pickle
 
@@ -73,8 +73,14 @@ class PickleStore(DataStore):
     def _put(self, key, data):
         """Store data in a pickle file."""
         path = self._get_key_path(key)
-        with open(path, "wb") as pickle_file:
+        # Write to a temporary file first and then move it into place, so a
+        # process that dies mid-write can't leave a truncated pickle behind.
+        # The temporary file is named for this process, since a forked
+        # snapshot can be saving the same key as its parent.
+        temp_path = "{}.{}.tmp".format(path, getpid())
+        with open(temp_path, "wb") as pickle_file:
             pickle.dump(data, pickle_file)
+        replace(temp_path, path)
 
     def _delete(self, key):
         """Delete a pickle file."""
@@ -14,14 +14,16 @@ from .. import BASE_PACKAGE, settings
 from ..libs.miniboa import TelnetClient
 from .accounts import AccountMenu, authenticate_account, create_account
 from .channels import Channel, CHANNELS
+from .const import *
 from .entities import ENTITIES, Unset
 from .events import EVENTS
+from .journal import JOURNAL
 from .logs import get_logger
 from .menus import Menu, MENUS
 from .net import CLIENTS
 from .pickle import PickleStore
 from .sessions import SESSIONS
-from .storage import STORES
+from .snapshots import SNAPSHOTS
 from .timing import TIMERS
 from .utils.exceptions import ServerReboot, ServerReload, ServerShutdown
 from .utils.funcs import joins
@@ -37,6 +39,10 @@ class Server:
     def __init__(self):
         self._socket_queue = None
         self._pid = None
+        # These are shared memory values set by the nanny process, used to
+        # let it know that this process is still alive and what it's doing.
+        self._heartbeat = None
+        self._phase = None
         self._rdb = redis.StrictRedis(decode_responses=True)
         self._channels = self._rdb.pubsub(ignore_subscribe_messages=True)
         self._store = PickleStore("server")
@@ -55,6 +61,22 @@ class Server:
         with EVENTS.fire("client_disconnected", client, no_pre=True):
             log.info("Lost connection from %s.", client.addrport())
 
+    @staticmethod
+    def _client_received(client):
+        session = SESSIONS.find_by_client(client)
+        if session:
+            session.wake()
+
+    def _set_phase(self, phase):
+        """Publish the current loop phase to the nanny process."""
+        if self._phase is not None:
+            self._phase.value = phase
+
+    def _beat(self):
+        """Publish a heartbeat to the nanny process."""
+        if self._heartbeat is not None:
+            self._heartbeat.value += 1
+
     def _handle_msg(self, msg):
         if msg["channel"] == "server-reboot":
             target_pid = int(msg["data"])
@@ -107,6 +129,14 @@ class Server:
         for module in settings.INCLUDE_MODULES:
             import_module(module, BASE_PACKAGE)
 
+        if settings.JOURNAL_CHANGES:
+            if not reload_from:
+                # Recover any changes that didn't make it into the last
+                # snapshot before anything gets loaded from the stores.  When
+                # reloading, the old process saves everything for us instead.
+                JOURNAL.replay()
+            JOURNAL.open()
+
         with EVENTS.fire("server_boot"):
             log.info("Booting server.")
             # Subscribe to Redis channels.
@@ -118,7 +148,8 @@ class Server:
                        settings.BIND_PORT,
                        self._client_connected,
                        self._client_disconnected,
-                       server_socket=0)
+                       server_socket=0,
+                       on_receive=self._client_received)
 
         log.info("Server listening at {}:{}.".format(
             settings.BIND_ADDRESS, settings.BIND_PORT))
@@ -139,6 +170,14 @@ class Server:
             self.load_state()
             self._store.delete("state")
             self._store.commit()
+        elif self._store.has("hot_keys"):
+            # We're starting back up after a shutdown, so load what was in
+            # use before rather than waiting for everyone to ask for it.
+            ENTITIES.prefetch(self._store.get("hot_keys"),
+                              settings.PREFETCH_PER_PULSE)
+        if self._store.has("hot_keys"):
+            self._store.delete("hot_keys")
+            self._store.commit()
 
         if reload_from:
             log.debug("Reload complete for process %s.", self._pid)
@@ -151,20 +190,34 @@ class Server:
         """Start the main server loop and loop until stopped."""
         try:
             while True:
+                self._beat()
                 # First check for messages.
+                self._set_phase(PHASE_MESSAGES)
                 msg = self._channels.get_message()
                 while msg:
                     self._handle_msg(msg)
                     msg = self._channels.get_message()
                 # Then do the main game logic.
+                self._set_phase(PHASE_LOOP_HOOKS)
                 with EVENTS.fire("server_loop"):
+                    self._set_phase(PHASE_TIMERS)
                     TIMERS.pulse()  # Pulse each timer once.
+                    self._set_phase(PHASE_SOCKETS)
                     self._check_new_sockets()
+                    self._set_phase(PHASE_SESSIONS)
                     SESSIONS.poll()  # Process queued IO.
+                    self._set_phase(PHASE_CLIENTS)
                     CLIENTS.poll()  # Check for new IO.
+                    self._set_phase(PHASE_EVENTS)
+                    EVENTS.dispatch_posted()  # Fire any posted events.
+                    self._set_phase(PHASE_PRUNE)
                     SESSIONS.prune()  # Clean up closed/dead sessions.
+                    SNAPSHOTS.poll()  # Check on any background saves.
+                    JOURNAL.flush()  # Record this pulse's changes.
+                    self._set_phase(PHASE_LOOP_HOOKS)
                 # Any thing you want polled or updated should be done before
                 # this point so that it is considered in the pulse delay.
+                self._set_phase(PHASE_PULSE)
                 TIMERS.sleep_excess()  # Wait until the next pulse is ready.
         except KeyboardInterrupt:
             log.info("Received keyboard interrupt, stopping.")
@@ -174,6 +227,7 @@ class Server:
             log.info("Received server reboot.")
         except ServerReload as exc:
             log.info("Reloading server.")
+            self._set_phase(PHASE_RELOAD)
             self._channels.subscribe("server-reload-complete")
             self._reloading = True
             # Do one last session and client poll to clear the output queues.
@@ -196,11 +250,16 @@ class Server:
                     if pid == exc.new_pid:
                         break
                 sleep(0.1)
+                self._beat()
         finally:
             if not self._reloading:
+                self._set_phase(PHASE_SHUTDOWN)
                 with EVENTS.fire("server_shutdown", no_post=True):
-                    ENTITIES.save()
-                    STORES.commit()
+                    self._store.put("hot_keys", ENTITIES.get_hot_keys(
+                        settings.PREFETCH_KEYS))
+                    self._store.commit()
+                    SNAPSHOTS.save(background=False)
+                    JOURNAL.close()
                     log.info("Server shutdown complete.")
                     self._rdb.publish("server-shutdown-complete", self._pid)
 
@@ -231,8 +290,7 @@ class Server:
         if self._store.has("state"):
             raise KeyError("a server state file already exists")
         log.info("Starting game state save.")
-        ENTITIES.save()
-        STORES.commit()
+        SNAPSHOTS.save(background=False)
         state = {}
         with EVENTS.fire("server_save_state", state):
             self._store.put("state", state)
@@ -273,7 +331,7 @@ def _hook_client_connected(client):
 def _hook_client_disconnected(client):
     session = SESSIONS.find_by_client(client)
     if session:
-        session._socket = None
+        session.wake()
 
 
 @EVENTS.hook("session_started")
@@ -338,8 +396,7 @@ if settings.FORCE_GC_COLLECT:
 
 @TIMERS.create("3m", "save_and_commit", repeat=-1)
 def _save_and_commit():
-    ENTITIES.save()
-    STORES.commit()
+    SNAPSHOTS.save()
 
 
 ANNOUNCE = Channel("^Y[ANNOUNCE]^W {msg}^~",
@@ -4,11 +4,14 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
-from collections import deque
+from collections import deque, OrderedDict
+from functools import lru_cache
+from heapq import heappop, heappush
 from os.path import exists, join
+from time import time as now
 
 from .. import __version__, settings
-from ..libs.miniboa import ANSI_CODES
+from ..libs.miniboa import ANSI_CODES, colorize, strip_caret_codes
 from .accounts import Account
 from .characters import Character
 from .const import *
@@ -35,6 +38,25 @@ class SessionManager:
         self.login_greeting_reader = "\nWelcome back!"
         self.login_greeting_ascii = self.login_greeting_reader
         self._sessions = {}
+        # Sessions indexed by their client, their client's fileno, and the
+        # UIDs of their account and character.
+        self._clients = {}
+        self._filenos = {}
+        self._accounts = {}
+        self._chars = {}
+        # Sessions that have something to do on the next poll, by port.
+        self._active = OrderedDict()
+        # Sessions that have closed since the last prune, by port.
+        self._closed = {}
+        # A heap of (deadline, port) for when sessions next need to be
+        # checked for being idle.
+        self._idle_deadlines = []
+        # How many times sessions have been polled for input, for timing
+        # wait states.
+        self._pulse = 0
+        # How many sessions were polled and how many of them had output
+        # held over to the next pulse, for the last poll and in total.
+        self.stats = {"polled": 0, "deferred": 0, "deferred_total": 0}
 
     def find_by_port(self, port):
         """Find a session by its port.
@@ -52,10 +74,58 @@ class SessionManager:
         :returns Session: A matching session or None
 
         """
-        for session in self._sessions.values():
-            # noinspection PyProtectedMember
-            if session._client is client:
-                return session
+        return self._clients.get(client)
+
+    def find_by_fileno(self, fileno):
+        """Find a session by its client's file descriptor.
+
+        :param int fileno: The file descriptor to search for
+        :returns Session: A matching session or None
+
+        """
+        return self._filenos.get(fileno)
+
+    def find_by_account(self, account):
+        """Find the session an account is logged in through.
+
+        :param accounts.Account account: The account to search for
+        :returns Session: A matching session or None
+
+        """
+        return self._accounts.get(account.uid)
+
+    def find_by_char(self, char):
+        """Find the session a character is being played through.
+
+        :param characters.Character char: The character to search for
+        :returns Session: A matching session or None
+
+        """
+        return self._chars.get(char.uid)
+
+    @staticmethod
+    def _reindex(index, session, old, new):
+        """Move a session from one key to another in an index.
+
+        :param dict index: The index to update
+        :param Session session: The session to move
+        :param old: The session's old entity, or None
+        :param new: The session's new entity, or None
+        :returns None:
+
+        """
+        if old is not None and index.get(old.uid) is session:
+            del index[old.uid]
+        if new is not None:
+            index[new.uid] = session
+
+    def _account_changed(self, session, old_account):
+        """Update the account index after a session's account changes."""
+        self._reindex(self._accounts, session, old_account, session.account)
+
+    def _char_changed(self, session, old_char):
+        """Update the character index after a session's character changes."""
+        self._reindex(self._chars, session, old_char, session.char)
 
     def create(self, client, shell=None):
         """Create a new session tied to the given client.
@@ -66,12 +136,40 @@ class SessionManager:
         :raises AlreadyExists: If a session with that client already exists
 
         """
-        if self.find_by_client(client):
-            raise AlreadyExists(client, self.find_by_client(client))
+        if client in self._clients:
+            raise AlreadyExists(client, self._clients[client])
         session = Session(client, shell)
+        session._manager = self
         self._sessions[session.port] = session
+        self._clients[client] = session
+        self._filenos[client.fileno] = session
+        self._active[session.port] = session
+        self._schedule_idle(session)
         return session
 
+    def wake(self, session):
+        """Make sure a session is polled on the next poll.
+
+        Only sessions that have pending input, queued output, or a pending
+        close are polled, and sessions wake themselves for the last two.
+
+        :param Session session: The session to wake
+        :returns None:
+
+        """
+        if self._sessions.get(session.port) is session:
+            self._active[session.port] = session
+
+    def _session_closed(self, session):
+        """Queue a closed session to be cleaned up on the next prune.
+
+        :param Session session: The session that closed
+        :returns None:
+
+        """
+        if self._sessions.get(session.port) is session:
+            self._closed[session.port] = session
+
     def poll(self, output_only=False):
         """Poll all sessions for queued IO.
 
@@ -81,17 +179,131 @@ class SessionManager:
         :returns None:
 
         """
-        for session in self._sessions.values():
-            session.poll(output_only)
+        if not output_only:
+            self._pulse += 1
+            self.check_idle()
+        polled = set()
+        deferred = 0
+        while True:
+            # Anything woken while polling gets polled this time too, unless
+            # it's already been polled.
+            ready = [session for port, session in self._active.items()
+                     if port not in polled]
+            if not ready:
+                break
+            for session in ready:
+                polled.add(session.port)
+                session.poll(output_only)
+                if session._output_deferred and session.has_pending_work:
+                    # They went over their output budget, so the rest of
+                    # their output waits and they go to the back of the line.
+                    deferred += 1
+                    self._active.move_to_end(session.port)
+                elif not session.has_pending_work:
+                    self._active.pop(session.port, None)
+        self.stats["polled"] = len(polled)
+        self.stats["deferred"] = deferred
+        self.stats["deferred_total"] += deferred
+
+    def _schedule_idle(self, session):
+        """Schedule the next time a session needs to be checked for idling.
+
+        A session only needs checking when it could next go idle, or be
+        idle for too long; if input arrives before then, the check will
+        find they're not idle and schedule another.
+
+        :param Session session: The session to schedule
+        :returns None:
 
-    def prune(self):
-        """Clean up closed or dead sessions."""
-        close = []
-        for port, session in self._sessions.items():
+        """
+        # noinspection PyProtectedMember
+        idle = session._client.idle()
+        if settings.IDLE_TIME and idle < settings.IDLE_TIME:
+            remaining = settings.IDLE_TIME - idle
+        elif settings.IDLE_TIME_MAX and idle < settings.IDLE_TIME_MAX:
+            remaining = settings.IDLE_TIME_MAX - idle
+        else:
+            # Nothing more can happen until they send some input.
+            session._idle_deadline = None
+            return
+        deadline = now() + remaining
+        session._idle_deadline = deadline
+        heappush(self._idle_deadlines, (deadline, session.port))
+
+    def check_idle(self):
+        """Check any sessions whose idle deadlines have passed.
+
+        :returns None:
+
+        """
+        deadlines = self._idle_deadlines
+        if not deadlines or deadlines[0][0] > now():
+            return
+        time = now()
+        while deadlines and deadlines[0][0] <= time:
+            deadline, port = heappop(deadlines)
+            session = self._sessions.get(port)
+            # noinspection PyProtectedMember
+            if not session or session._idle_deadline != deadline:
+                # The session is gone or has been rescheduled since.
+                continue
+            session._idle_deadline = None
             if not session.active:
-                close.append(port)
-        for port in close:
+                continue
+            # noinspection PyProtectedMember
+            session._check_idle()
+            if "close" not in session.flags:
+                self._schedule_idle(session)
+
+    def prune(self):
+        """Clean up closed or dead sessions.
+
+        Sessions are closed on their last poll (disconnected clients wake
+        their sessions for it), so only the sessions that have closed since
+        the last prune need to be looked at.
+
+        """
+        closed, self._closed = self._closed, {}
+        for port, session in closed.items():
+            if self._sessions.get(port) is not session:
+                continue
             del self._sessions[port]
+            if self._active.get(port) is session:
+                del self._active[port]
+            # noinspection PyProtectedMember
+            client = session._client
+            if self._clients.get(client) is session:
+                del self._clients[client]
+            if self._filenos.get(client.fileno) is session:
+                del self._filenos[client.fileno]
+            self._reindex(self._accounts, session, session.account, None)
+            self._reindex(self._chars, session, session.char, None)
+
+    @staticmethod
+    def broadcast(message, sessions, end="\n"):
+        """Send the same message to many sessions.
+
+        The message is only rendered once for each distinct combination of
+        color and width among the sessions, and the rendered output is then
+        shared between all the sessions that use it.
+
+        :param str message: The message to send
+        :param iterable<Session> sessions: The sessions to send it to
+        :param str end: Optional, a terminator appended to the message
+        :returns None:
+
+        """
+        message += end
+        rendered = {}
+        for session in sessions:
+            if session is None:
+                continue
+            variant = (session.color, session.width)
+            data = rendered.get(variant)
+            if data is None:
+                data = Session.render(message, *variant)
+                rendered[variant] = data
+            session.send_raw(data)
 
     def all(self):
         """Return an iterator for all sessions."""
@@ -112,10 +324,15 @@ class Session(HasFlags):
         self._output_queue = deque()
         self._request_queue = deque()
         self._menu = None
+        self._pager = None
         self._shell = None
         self._account = None
         self._char = None
         self._client = client
+        self._manager = None
+        self._idle_deadline = None
+        self._output_deferred = False
+        self._wait_until = 0
         if shell:
             self.shell = shell
         # Display options
@@ -134,6 +351,39 @@ class Session(HasFlags):
         return (not self.flags.has_any("closed", "dead") and
                 self._client and self._client.active)
 
+    @property
+    def has_pending_work(self):
+        """Return whether this session has anything left to poll for."""
+        if "closed" in self.flags or not self._client:
+            return False
+        return bool(self._output_queue or "close" in self.flags or
+                    not self.active or self._client.cmd_ready)
+
+    @property
+    def waiting(self):
+        """Return whether this session is in a wait state."""
+        return bool(self._manager) and self._wait_until > self._manager._pulse
+
+    def wait(self, pulses):
+        """Put this session in a wait state for a number of pulses.
+
+        Input isn't processed while a session is waiting, it stays queued
+        until the wait is over.  Waits don't stack, the longest one wins.
+
+        :param int pulses: The number of pulses to wait
+        :returns None:
+
+        """
+        if self._manager:
+            # noinspection PyProtectedMember
+            self._wait_until = max(self._wait_until,
+                                   self._manager._pulse + pulses)
+
+    def wake(self):
+        """Make sure this session is polled on its manager's next poll."""
+        if self._manager:
+            self._manager.wake(self)
+
     @property
     def address(self):
         """Return the address this session is connected from."""
@@ -144,6 +394,12 @@ class Session(HasFlags):
         """Return the port this session is connected through."""
         return self._client.port
 
+    @property
+    def rows(self):
+        """Return the height of this session's screen, in lines."""
+        # Clients that don't know their height may report it as zero.
+        return self._client.rows or 24
+
     @property
     def menu(self):
         """Return the current menu for this session."""
@@ -219,6 +475,7 @@ class Session(HasFlags):
         :raises TypeError: If `new_account` is not an instance of Account
 
         """
+        old_account = self._account
         if new_account is None:
             self._account = None
         else:
@@ -230,6 +487,9 @@ class Session(HasFlags):
             if new_account.options.width:
                 self.width = new_account.options.width
             self.color = bool(new_account.options.color)
+        if self._manager:
+            # noinspection PyProtectedMember
+            self._manager._account_changed(self, old_account)
 
     @property
     def char(self):
@@ -244,6 +504,7 @@ class Session(HasFlags):
         :return None:
 
         """
+        old_char = self._char
         if new_char is None:
             self._char = None
         else:
@@ -251,6 +512,9 @@ class Session(HasFlags):
                 raise TypeError("argument must be a Character instance")
             self._char = new_char
             new_char.session = self
+        if self._manager:
+            # noinspection PyProtectedMember
+            self._manager._char_changed(self, old_char)
 
     @property
     def color(self):
@@ -279,6 +543,9 @@ class Session(HasFlags):
         with other whitespace characters like \t, \f, or \v, so including any
         of those will throw off the count and/or mess up the text.
 
+        Wrapped lines are cached by text and width, so repeated lines like
+        room descriptions are only wrapped once.
+
         :param str text: The text to be wrapped
         :param int width: The target width to wrap the text around
         :param bool parse_codes: Whether the parser should check for Miniboa
@@ -286,34 +553,19 @@ class Session(HasFlags):
         :returns list: A list of wrapped strings
 
         """
-        length = len(text)
-        index = 0
-        count = 0
-        space = -1
-        while index < length and count < width:
-            if parse_codes and text[index] == "^":
-                if text[index:index + 2] in ANSI_CODES:
-                    index += 1
-                elif text[index:index + 2] == "^^":
-                    index += 1
-                    count += 1
-                else:
-                    count += 1
-            else:
-                if text[index] == " ":
-                    space = index
-                count += 1
-            index += 1
-        stop = space if space > -1 else index
-        if index == length:
-            # End of the line, send everything.
-            return [text]
-        else:
-            # We've hit this session's line width, send up to the last
-            # space if there was one and then start over from there.
-            wrapped = [text[:stop]]
-            wrapped.extend(cls.wrap_to_width(text[stop + 1:]))
-            return wrapped
+        return list(_wrap_text(text, width, parse_codes))
+
+    @classmethod
+    def render(cls, text, color=False, width=80):
+        """Render text the way it would be sent to a client.
+
+        :param str text: The text to render
+        :param bool color: Whether to colorize the text or strip its codes
+        :param int width: The width to wrap the text to
+        :returns bytes: The rendered text, ready to send
+
+        """
+        return _render_output((text,), width, color)
 
     def _check_idle(self):
         """Check if this session is idle."""
@@ -335,11 +587,15 @@ class Session(HasFlags):
                     self.send("You are whisked away into the void.")
                     self.flags.add("idle")
         elif "idle" in self.flags:
-            # They came back, huzzah.
-            with EVENTS.fire("session_idle_return"):
-                log.info("%s is no longer idle.", self)
-                self.send("You have returned from the void.")
-                self.flags.drop("idle")
+            self._return_from_idle()
+
+    def _return_from_idle(self):
+        """Bring this session back from being idle."""
+        # They came back, huzzah.
+        with EVENTS.fire("session_idle_return"):
+            log.info("%s is no longer idle.", self)
+            self.send("You have returned from the void.")
+            self.flags.drop("idle")
 
     def _parse_input(self, data):
         """Process input from the client.
@@ -348,6 +604,15 @@ class Session(HasFlags):
         :returns None:
 
         """
+        if self._pager:
+            if not data:
+                # They just hit enter, show them the next page.
+                self._show_page()
+                return
+            # Anything else ends the paging, and quitting is all 'q' does.
+            self._pager = None
+            if data.lower() == "q":
+                return
         if not data:
             # They just hit enter, let the prompt repeat itself.
             return
@@ -367,7 +632,9 @@ class Session(HasFlags):
         :returns str: The generated prompt
 
         """
-        if self._request_queue:
+        if self._pager:
+            return "^y[^WEnter^y to continue, ^Wq^y to quit]^~ "
+        elif self._request_queue:
             return self._request_queue[0].get_prompt()
         elif self._menu:
             return self._menu.get_prompt()
@@ -393,9 +660,47 @@ class Session(HasFlags):
 
         """
         self._output_queue.append(joins(data, *more, sep=sep) + end)
+        self.wake()
 
-    def _send(self, data):
+    def page(self, source):
+        """Send a long block of text to this session a screen at a time.
 
+        Only the first screen is sent right away; after that the session
+        is shown one more screen each time they hit enter, until they run
+        out of text or send anything else.  The text is only wrapped as
+        it's shown, so if `source` is a generator, lines they never see are
+        never even generated.
+
+        :param str|iterable source: The text to send, or its lines
+        :returns None:
+
+        """
+        self._pager = Pager(source)
+        self._show_page()
+
+    def _show_page(self):
+        """Send the next screen of text from this session's pager."""
+        # Leave a line for the prompt.
+        text = self._pager.get_page(self.width, self.rows - 1)
+        if self._pager.done:
+            self._pager = None
+        self.send(text)
+
+    def send_raw(self, data):
+        """Send output to this session that has already been rendered.
+
+        Like with send, the output will be put in a queue to be sent during
+        the session's next poll.  It should have been rendered for this
+        session's color and width, see Session.render.
+
+        :param bytes data: The rendered output
+        :returns None:
+
+        """
+        self._output_queue.append(data)
+        self.wake()
+
+    def _send(self, data):
         """Put data in the client's output buffer to be sent next socket poll.
 
         The given data will be processed for any necessary text formatting
@@ -405,14 +710,7 @@ class Session(HasFlags):
         :returns None:
 
         """
-        lines = data.split("\n")
-        formatted = []
-        for line in lines:
-            if line:
-                formatted.extend(self.wrap_to_width(line, self.width))
-            else:
-                formatted.append("")
-        self._client.send_cc("\n".join(formatted))
+        self._client.send_raw(self.render(data, self.color, self.width))
 
     def poll(self, output_only=False):
         """Check the status of this session and process any queued IO.
@@ -432,33 +730,71 @@ class Session(HasFlags):
                 self.flags.drop("close")
                 self._close()
                 self.flags.add("closed")
+            if self._manager:
+                # noinspection PyProtectedMember
+                self._manager._session_closed(self)
         # If they're still around, handle their business.
         if self._client.active:
-            if not output_only and self.active:
-                self._check_idle()
             data = None
             if not output_only:
-                # Process input through the command queue.
-                if self._client.cmd_ready and self.active:
-                    data = self._client.get_command()
-                    if data is not None:
-                        self._parse_input(data)
+                # Process input through the command queue, as much of it as
+                # their budget and the lag from their commands allows.
+                budget = settings.COMMANDS_PER_PULSE
+                handled = 0
+                while (self._client.cmd_ready and self.active and
+                       "close" not in self.flags and not self.waiting and
+                       not (budget and handled >= budget)):
+                    command = self._client.get_command()
+                    if command is None:
+                        break
+                    data = command
+                    handled += 1
+                    if "idle" in self.flags:
+                        self._return_from_idle()
+                    if self._manager and self._idle_deadline is None:
+                        # They were idle with nothing left to check for,
+                        # so start checking again now they're back.
+                        # noinspection PyProtectedMember
+                        self._manager._schedule_idle(self)
+                    self._parse_input(command)
             # Process output from the output queue.
             output = None
-            if self._output_queue and self._client:
-                # This can later be made more sophisticated with paged output,
-                # width-reformatting, etc., but for now it's pretty simple.
-                if data is None:
+            queue = self._output_queue
+            if queue and self._client:
+                output = []
+                if data is None and not self._output_deferred:
                     # We didn't get a command this poll, so we need to send
-                    # them a newline before anything else.
-                    self._output_queue.appendleft("\n")
-                output = "".join(self._output_queue)
-                self._send(output)
-                self._output_queue.clear()
-            # Send them a prompt if there was any input or output.
+                    # them a newline before anything else (unless this is
+                    # the rest of output held over from an earlier poll).
+                    output.append("\n")
+                max_chars = settings.OUTPUT_CHARS_PER_PULSE
+                max_chunks = settings.OUTPUT_CHUNKS_PER_PULSE
+                sent_chars = sent_chunks = 0
+                # Always send at least one chunk, so that a chunk bigger
+                # than the budget can't hold up the queue forever.
+                while queue and not (
+                        sent_chunks and
+                        ((max_chars and sent_chars >= max_chars) or
+                         (max_chunks and sent_chunks >= max_chunks))):
+                    chunk = queue.popleft()
+                    sent_chars += len(chunk)
+                    sent_chunks += 1
+                    output.append(chunk)
+            # Anything left over waits for the next poll.
+            self._output_deferred = bool(queue)
+            # Send them a prompt if there was any input or output, once all
+            # their output has been sent.
             if ((data is not None or output is not None) and self.active and
-                    "close" not in self.flags):
-                self._send(joins("\n", self._get_prompt(), sep=""))
+                    not self._output_deferred and "close" not in self.flags):
+                if output is None:
+                    output = []
+                output.append("\n")
+                output.append(self._get_prompt())
+            if output:
+                # Everything for this poll is rendered in one pass and
+                # handed to the client at once.
+                self._client.send_raw(_render_output(output, self.width,
+                                                     self.color))
 
     def _close(self):
         """Really close a session's socket."""
@@ -492,6 +828,7 @@ class Session(HasFlags):
         if self.account:
             self.account.logout(self)
         self.flags.add("close")
+        self.wake()
 
     def request(self, request_class, callback, **options):
         """Request data from the client.
@@ -519,6 +856,194 @@ class Session(HasFlags):
         self._parse_input(input_string)
 
 
+def _break_word(word, width, parse_codes):
+    """Break a word that's too long for a line into chunks of a given width.
+
+    :param str word: The word to break up
+    :param int width: The width of each chunk
+    :param bool parse_codes: Whether to check for Miniboa formatting codes
+                             when counting width
+    :returns tuple: The chunks, and the width of the last one
+
+    """
+    chunks = []
+    length = len(word)
+    start = 0
+    while True:
+        index = start
+        count = 0
+        while index < length and count < width:
+            if parse_codes and word[index] == "^":
+                if word[index:index + 2] in ANSI_CODES:
+                    index += 1
+                elif word[index:index + 2] == "^^":
+                    index += 1
+                    count += 1
+                else:
+                    count += 1
+            else:
+                count += 1
+            index += 1
+        if parse_codes:
+            # Formatting codes right after a full chunk don't take up any
+            # width, so keep them with that chunk.
+            while word[index:index + 2] in ANSI_CODES:
+                index += 2
+        if index >= length:
+            chunks.append(word[start:])
+            return chunks, count
+        chunks.append(word[start:index])
+        start = index
+
+
+@lru_cache(maxsize=1024)
+def _wrap_text(text, width, parse_codes):
+    """Wrap text to a given width, in one pass over its words.
+
+    See Session.wrap_to_width for details.
+
+    :param str text: The text to be wrapped
+    :param int width: The target width to wrap the text around
+    :param bool parse_codes: Whether the parser should check for Miniboa
+                             formatting codes with counting width
+    :returns tuple: The wrapped strings
+
+    """
+    width = max(width, 1)
+    wrapped = []
+    line = []
+    count = 0
+    # Splitting on single spaces keeps any runs of spaces as empty words,
+    # so joining a line's words back together loses nothing.
+    for word in text.split(" "):
+        if parse_codes and "^" in word:
+            size = len(strip_caret_codes(word))
+        else:
+            size = len(word)
+        if line:
+            if count + 1 + size <= width:
+                line.append(word)
+                count += 1 + size
+                continue
+            # This word doesn't fit, so it starts the next line and the
+            # space before it is dropped.
+            wrapped.append(" ".join(line))
+        if size > width:
+            chunks, size = _break_word(word, width, parse_codes)
+            wrapped.extend(chunks[:-1])
+            word = chunks[-1]
+        line = [word]
+        count = size
+    wrapped.append(" ".join(line))
+    return tuple(wrapped)
+
+
+def _render_output(chunks, width, ansi):
+    """Render a sequence of output chunks into bytes in a single pass.
+
+    Text chunks are split into lines and wrapped as they come, with lines
+    that span chunks put back together first, and each run of text is then
+    colorized and encoded at once.  Bytes chunks have already been rendered
+    and are passed through as they are.
+
+    :param iterable chunks: The str or bytes chunks to render
+    :param int width: The width to wrap text to
+    :param bool ansi: Whether to colorize text or strip its codes
+    :returns bytes: The rendered output, ready to send
+
+    """
+    rendered = []
+    lines = []
+    partial = ""  # The start of a line that's continued in the next chunk.
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            # Already rendered, probably from a broadcast.
+            if lines or partial:
+                lines.extend(_wrap_line(partial, width))
+                text = colorize("\r\n".join(lines), ansi)
+                rendered.append(text.encode("cp1252"))
+                lines.clear()
+                partial = ""
+            rendered.append(chunk)
+            continue
+        if "\n" not in chunk:
+            partial += chunk
+            continue
+        chunk_lines = chunk.split("\n")
+        chunk_lines[0] = partial + chunk_lines[0]
+        partial = chunk_lines.pop()
+        for line in chunk_lines:
+            lines.extend(_wrap_line(line, width))
+    if lines or partial:
+        lines.extend(_wrap_line(partial, width))
+        text = colorize("\r\n".join(lines), ansi)
+        rendered.append(text.encode("cp1252"))
+    return b"".join(rendered)
+
+
+def _wrap_line(line, width):
+    """Wrap a line of output to a given width, if it needs it.
+
+    :param str line: The line to wrap, with no newlines in it
+    :param int width: The width to wrap the line to
+    :returns sequence: The wrapped lines
+
+    """
+    if len(line) <= width:
+        # It can't be too wide, even counting any codes.
+        return (line,)
+    return _wrap_text(line, width, True)
+
+
+class Pager:
+
+    """A lazy source of text that can be taken a screen at a time."""
+
+    def __init__(self, source):
+        """Create a new pager.
+
+        :param str|iterable source: The text to page, or its lines
+        :returns None:
+
+        """
+        if isinstance(source, str):
+            source = source.split("\n")
+        self._lines = iter(source)
+        self._wrapped = deque()
+        self.done = False
+
+    def _fill(self, width):
+        """Wrap the next line of the source, if there is one."""
+        for line in self._lines:
+            line = str(line)
+            if line:
+                self._wrapped.extend(Session.wrap_to_width(line, width))
+            else:
+                self._wrapped.append("")
+            return
+        self.done = True
+
+    def get_page(self, width, rows):
+        """Take the next screen of text from this pager.
+
+        :param int width: The width of the screen
+        :param int rows: The height of the screen, in lines
+        :returns str: The next page of text
+
+        """
+        page = []
+        while len(page) < max(rows, 1):
+            if not self._wrapped:
+                self._fill(width)
+                if not self._wrapped:
+                    break
+            page.append(self._wrapped.popleft())
+        if not self._wrapped:
+            # Look ahead, so we know if this was the last page.
+            self._fill(width)
+        return "\n".join(page)
+
+
 # We create a global SessionManager here for convenience, and while the server
 # will generally only need one to work with, they are NOT singletons and you
 # can make more SessionManager instances if you like.
@@ -557,12 +1082,26 @@ def _hook_server_load_state(state):
     from .menus import MENUS
     from .net import CLIENTS
     sessions = state["sessions"]
-    for port, (output, shell, menu, email,
-               char, width, color) in sessions.items():
+    restoring = []
+    emails = set()
+    names = set()
+    for port, session_data in sessions.items():
         client = CLIENTS.find_by_port(port)
         if not client:
             # The client is gone, so no need for the session.
             continue
+        restoring.append((client, session_data))
+        email, char = session_data[3:5]
+        if email:
+            emails.add(email)
+        if char:
+            names.add(char)
+    # Load all the accounts and characters in one go, rather than searching
+    # through the loaded ones again for every session.
+    accounts = Account.load_many(emails)
+    chars = Character.load_many(names)
+    for client, (output, shell, menu, email,
+                 char, width, color) in restoring:
         session = SESSIONS.find_by_client(client)
         if session:
             if shell:
@@ -575,9 +1114,9 @@ def _hook_server_load_state(state):
             menu = MENUS[menu](session)
         session._menu = menu
         if email:
-            session.account = Account.load(email)
-        if char:
-            session.char = Character.load(char)
+            session.account = accounts.get(email)
+        if char and char in chars:
+            session.char = chars[char]
             session.char.resume(quiet=True)
         session.width = width
         session.color = color
@@ -4,9 +4,14 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
-from weakref import WeakValueDictionary
-
-from .commands import Command
+from bisect import bisect_left, insort
+from functools import lru_cache
+from itertools import count, islice
+import re
+from time import perf_counter
+from weakref import ref, WeakValueDictionary
+
+from .commands import Command, COMMANDS
 from .const import *
 from .logs import get_logger
 from .utils.exceptions import AlreadyExists
@@ -17,6 +22,41 @@ from .utils.mixins import (HasFlags, HasFlagsMeta, HasParent, HasParentMeta,
 
 log = get_logger("shells")
 
+# How many verbs a shell will remember resolving before starting over.
+_RESOLVED_MAX = 4096
+# This goes up whenever any shell's verbs or lineage change, so that every
+# shell knows to forget what it has resolved.
+_resolved_generation = 0
+
+
+def _invalidate_resolved():
+    """Make every shell forget the commands it has resolved verbs to."""
+    global _resolved_generation
+    _resolved_generation += 1
+
+
+@lru_cache()
+def _get_argument_pattern(delimiters):
+    """Compile a pattern that matches one argument, for a set of delimiters.
+
+    The pattern skips any leading whitespace, and has one group for each
+    pair of delimiters (an opening delimiter, then anything up to the
+    closing delimiter or the end of the input) and one for an undelimited
+    argument (anything up to whitespace or an opening delimiter).  Which
+    group matched is the match's lastindex.
+
+    :param tuple<str,str> delimiters: The opening and closing delimiters
+    :returns re.RegexObject: The compiled pattern
+
+    """
+    alternatives = []
+    for opening, closing in zip(*delimiters):
+        alternatives.append("{0}([^{1}]*){1}?".format(re.escape(opening),
+                                                      re.escape(closing)))
+    alternatives.append(r"(\S[^ \n\r\t{}]*)".format(
+        re.escape(delimiters[0])))
+    return re.compile(r"\s*(?:{})".format("|".join(alternatives)))
+
 
 class ShellManager:
 
@@ -59,12 +99,148 @@ class ShellManager:
         return shell
 
 
+class _VerbTable:
+
+    """A table of verbs and the commands they trigger.
+
+    Only the full verbs are stored, in a sorted list; abbreviations are
+    found by searching that list for verbs that start with them, and then
+    cached until the table changes.  An abbreviation belongs to the first
+    command registered (with truncation) that has a verb starting with it.
+
+    Removing a verb also removes any shorter forms of it that belonged to
+    the same command, and those stay removed until a verb that starts
+    with them is added again, just as if every truncated form had been
+    stored and then deleted.
+
+    """
+
+    def __init__(self):
+        self._commands = WeakValueDictionary()
+        # The order each verb was added in and whether it can be truncated.
+        self._entries = {}
+        self._sorted = []
+        # The abbreviations removed with a verb, and when they were removed.
+        self._removed = {}
+        # Weak references to the commands verbs have been resolved to.
+        self._resolved = {}
+        self._counter = count()
+
+    def __contains__(self, verb):
+        return self.get(verb) is not None
+
+    def __getitem__(self, verb):
+        command = self.get(verb)
+        if command is None:
+            raise KeyError(verb)
+        return command
+
+    def __len__(self):
+        return len(self._commands)
+
+    def has_verb(self, verb):
+        """Return whether a verb is in this table, not counting abbreviations.
+
+        :param str verb: The verb to check for
+        :returns bool: Whether the verb is in the table
+
+        """
+        return verb in self._commands
+
+    def get(self, verb):
+        """Get the command for a verb or an abbreviation of one.
+
+        :param str verb: The verb to look up
+        :returns Command|None: The command for that verb or None
+
+        """
+        command_ref = self._resolved.get(verb)
+        if command_ref is not None:
+            command = command_ref()
+            if command is not None:
+                return command
+        command = self._resolve(verb)
+        if command is not None:
+            self._resolved[verb] = ref(command)
+        return command
+
+    def _resolve(self, verb):
+        verbs = self._sorted
+        start = bisect_left(verbs, verb)
+        if (not verb or start == len(verbs) or
+                not verbs[start].startswith(verb)):
+            # Nothing starts with it, which is most bad input.
+            return None
+        if verbs[start] == verb:
+            return self._commands.get(verb)
+        # Any abbreviation removed with another verb only belongs to verbs
+        # added since.
+        removed = self._removed.get(verb, -1)
+        best = None
+        best_order = None
+        for full_verb in islice(verbs, start, None):
+            if not full_verb.startswith(verb):
+                break
+            order, truncate = self._entries[full_verb]
+            if (truncate and order > removed and
+                    (best_order is None or order < best_order)):
+                command = self._commands.get(full_verb)
+                if command is not None:
+                    best, best_order = command, order
+        return best
+
+    def add(self, verb, command, truncate=True):
+        """Add a verb to this table.
+
+        :param str verb: The verb to add
+        :param Command command: The command the verb triggers
+        :param bool truncate: Whether the verb can be abbreviated
+        :returns None:
+
+        """
+        if verb not in self._entries:
+            insort(self._sorted, verb)
+        self._commands[verb] = command
+        self._entries[verb] = (next(self._counter), truncate)
+        self._removed.pop(verb, None)
+        self._resolved.clear()
+
+    def remove(self, verb):
+        """Remove a verb, and any shorter forms of it for the same command.
+
+        :param str verb: The verb (or abbreviation) to remove
+        :returns None:
+
+        """
+        command = self.get(verb)
+        if command is None:
+            return
+        removing = [verb[:length] for length in range(len(verb), 0, -1)
+                    if self.get(verb[:length]) is command]
+        order = next(self._counter)
+        for prefix in removing:
+            if self._commands.get(prefix) is command:
+                del self._commands[prefix]
+                del self._entries[prefix]
+                del self._sorted[bisect_left(self._sorted, prefix)]
+            self._removed[prefix] = order
+        self._resolved.clear()
+
+
 class _ShellMeta(HasFlagsMeta, HasWeaksMeta, HasParentMeta):
 
     def __init__(cls, name, bases, namespace):
         super().__init__(name, bases, namespace)
-        cls._verbs = WeakValueDictionary()
-        cls._truncated_verbs = WeakValueDictionary()
+        cls._verbs = _VerbTable()
+        # The commands verbs were resolved to through this shell's lineage.
+        cls._resolved = {}
+        cls._resolved_generation = _resolved_generation
+
+    def __setattr__(cls, name, value):
+        super().__setattr__(name, value)
+        if name == "parent_first":
+            # This changes the order of every lineage this shell is in.
+            _invalidate_resolved()
 
 
 class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
@@ -74,7 +250,6 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
     # These are overridden in the metaclass, I just put them here
     # to avoid a lot of unresolved reference errors in IDE introspection.
     _verbs = None
-    _truncated_verbs = None
 
     state = STATE_CONNECTED
 
@@ -150,27 +325,14 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
         # only then to find out that another is bad and try and clean up.
         for verb in verbs:
             cls._validate_verb(verb)
-            if verb in cls._verbs and verb not in cls._truncated_verbs:
+            if cls._verbs.has_verb(verb):
                 raise AlreadyExists(verb, cls._verbs[verb], command)
         for verb in verbs:
-            verb = verb.lower()
-            cls._verbs[verb] = command
-            if verb in cls._truncated_verbs:
-                del cls._truncated_verbs[verb]
-            if truncate:
-                # Check all the shorter forms and add them if they're valid.
-                # We're trading off the memory of a bigger dict to store the
-                # truncated entries versus the CPU time it would take to search
-                # a store of full commands for a partial match.
-                verb = verb[:-1]
-                while verb:
-                    if verb not in cls._verbs:
-                        # First come, first served.  If you want a command to
-                        # have truncated priority over another, register it
-                        # first.
-                        cls._verbs[verb] = command
-                        cls._truncated_verbs[verb] = command
-                    verb = verb[:-1]
+            # First come, first served for the truncated forms.  If you want
+            # a command to have truncated priority over another, register
+            # it first.
+            cls._verbs.add(verb.lower(), command, truncate)
+        _invalidate_resolved()
 
     @classmethod
     def remove_verbs(cls, *verbs):
@@ -181,14 +343,8 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
 
         """
         for verb in verbs:
-            command = cls._verbs.get(verb)
-            if command:
-                del cls._verbs[verb]
-                verb = verb[:-1]
-                while verb:
-                    if cls._verbs.get(verb) is command:
-                        del cls._verbs[verb]
-                    verb = verb[:-1]
+            cls._verbs.remove(verb)
+        _invalidate_resolved()
 
     @classmethod
     def get_command(cls, verb):
@@ -205,17 +361,31 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
         """Find a command in this shell's lineage by its verb.
 
         Will return the first command found, as multiple stores may have
-        different commands using the same verb.
+        different commands using the same verb.  What each verb resolves to
+        is remembered until the verbs or lineage of any shell change.
 
         :param str verb: The verb of the command to search for
         :returns Command|None: The command with that verb or None
 
         """
         verb = verb.lower()
+        if cls._resolved_generation != _resolved_generation:
+            cls._resolved = {}
+            cls._resolved_generation = _resolved_generation
+        try:
+            return cls._resolved[verb]
+        except KeyError:
+            pass
+        command = None
         for shell in cls.get_lineage():
             command = shell.get_command(verb)
             if command:
-                return command
+                break
+        if len(cls._resolved) >= _RESOLVED_MAX:
+            # Probably a lot of junk input, start over.
+            cls._resolved.clear()
+        cls._resolved[verb] = command
+        return command
 
     @classmethod
     def _one_argument(cls, data):
@@ -229,47 +399,24 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
         :returns tuple<str,str>: The parsed argument and any remaining data
 
         """
-        # Dump leading whitespace.
-        data = data.lstrip()
-        # Is there anything left to parse?
-        if not data:
-            return "", ""
-        if data[0] in cls.delimiters[0]:
-            # This is a delimited string, so read until it ends or data does.
-            delimiter = cls.delimiters[0].index(data[0])
-            delimiter_end = cls.delimiters[1][delimiter]
-            closed = False
-            try:
-                # Does this delimited string have a closing delimiter?
-                end = data.index(delimiter_end, 1)
-                closed = True
-            except ValueError:
-                # No it doesn't, so read everything.
-                end = len(data)
-            arg = data[1:end]
-            if closed:
-                end += 1
-            if not arg:
-                # It was an empty delimited string, start over and
-                # look for a new argument.
-                return cls._one_argument(data[end:])
-        else:
-            # Not a delimited string, so read until whitespace or a delimiter.
-            end = 1
-            data_end = len(data)
-            stop_on = " \n\r\t" + cls.delimiters[0]
-            while end < data_end:
-                if data[end] in stop_on:
-                    break
-                end += 1
-            arg = data[:end]
-        # One way or another, we found an argument.
-        return arg, data[end:]
+        pattern = _get_argument_pattern(cls.delimiters)
+        start = 0
+        while True:
+            match = pattern.match(data, start)
+            if not match:
+                # There was nothing but whitespace left.
+                return "", ""
+            arg = match.group(match.lastindex)
+            if arg:
+                return arg, data[match.end():]
+            # It was an empty delimited string, so look for a new argument.
+            start = match.end()
 
     @classmethod
     def _iter_arguments(cls, data):
-        while data:
-            arg, data = cls._one_argument(data)
+        pattern = _get_argument_pattern(cls.delimiters)
+        for match in pattern.finditer(data):
+            arg = match.group(match.lastindex)
             if arg:
                 yield arg
 
@@ -287,15 +434,27 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
         :returns list: The parsed arguments
 
         """
+        pattern = _get_argument_pattern(cls.delimiters)
+        if max_args < 0:
+            # Only one group of each match will have matched anything.
+            return [arg for arg in map("".join, pattern.findall(data))
+                    if arg]
         args = []
-        while data and max_args != 0:
-            arg, data = cls._one_argument(data)
+        start = 0
+        end = len(data)
+        while start < end and max_args != 0:
+            match = pattern.match(data, start)
+            if not match:
+                # There was nothing but whitespace left.
+                return args
+            start = match.end()
+            arg = match.group(match.lastindex)
             if arg:
                 args.append(arg)
-            if max_args > 0:
-                max_args -= 1
-        if data:
-            args.append(data)
+                if max_args > 0:
+                    max_args -= 1
+        if start < end:
+            args.append(data[start:])
         return args
 
     def parse(self, data):
@@ -324,6 +483,7 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
                 args = [data]
             else:
                 args = self._get_arguments(data)
+            started = perf_counter()
             try:
                 # noinspection PyCallingNonCallable
                 instance = command(self.session, args)
@@ -331,6 +491,9 @@ class Shell(HasFlags, HasWeaks, HasParent, metaclass=_ShellMeta):
             except:
                 # To be expanded later with some checking and logging.
                 raise
+            finally:
+                COMMANDS.record_timing(command, perf_counter() - started,
+                                       args)
         else:
             self.session.send("Huh?")
 
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Saving snapshots of the game state."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+import gc
+import os
+from time import time as now
+
+from .. import settings
+from .entities import ENTITIES
+from .journal import JOURNAL
+from .logs import get_logger
+from .storage import STORES
+
+
+log = get_logger("snapshots")
+
+
+# noinspection PyProtectedMember
+class SnapshotManager:
+
+    """A manager for saving dirty entities and committing data stores.
+
+    A snapshot can be saved in the foreground, which blocks the game loop
+    until every dirty entity has been serialized and written, or in the
+    background, where the process forks and the child writes out its
+    copy-on-write view of the game state while the parent keeps looping.
+
+    The parent only considers the entities in a background snapshot saved
+    once the child exits successfully; anything that changes in the
+    meantime stays dirty and is picked up by the next snapshot.
+
+    If a journal is given, it is truncated after each snapshot is saved, since
+    the changes in it are no longer needed to recover from a crash.
+
+    """
+
+    def __init__(self, entities=ENTITIES, stores=STORES, journal=None):
+        """Create a new snapshot manager.
+
+        :param entities.EntityManager entities: The entities to save
+        :param storage.DataStoreManager stores: The stores to commit
+        :param journal.Journal journal: A journal of changes since the last
+                                        snapshot, if any
+
+        """
+        self._entities = entities
+        self._stores = stores
+        self._journal = journal
+        self._child = None
+        self._saving = ()
+        self._committing = ()
+        self._segments = ()
+        self._started = 0
+        # How long the game loop was blocked by the last snapshot.
+        self.last_pause = 0.0
+
+    @property
+    def in_progress(self):
+        """Return whether a background snapshot is being saved."""
+        return self._child is not None
+
+    def save(self, background=None):
+        """Save a snapshot of all dirty entities and commit all stores.
+
+        If a background snapshot is already in progress, a new background
+        snapshot will not be started, while a foreground snapshot will wait
+        for it to finish first.
+
+        :param bool background: Whether to save the snapshot from a forked
+                                child process; if None, the
+                                BACKGROUND_SAVES setting is used
+        :returns bool: Whether a snapshot was started
+
+        """
+        if background is None:
+            background = settings.BACKGROUND_SAVES
+        if background and not hasattr(os, "fork"):  # pragma: no cover
+            background = False
+        if self._child is not None:
+            if background:
+                log.debug("Background snapshot already in progress.")
+                return False
+            self.wait()
+        if background:
+            self._fork()
+        else:
+            started = now()
+            self._entities.save()
+            self._stores.commit()
+            if self._journal:
+                self._journal.truncate()
+            self.last_pause = now() - started
+        return True
+
+    def _fork(self):
+        """Fork a child process to save a background snapshot."""
+        started = now()
+        saving = []
+        for instance in self._entities.get_dirty():
+            if "_old_key" in instance.tags:
+                # Changing an entity's key means deleting its old data, and
+                # the parent needs to know that happened; they're rare enough
+                # that we can just save them here.
+                instance.save()
+            else:
+                saving.append((instance, instance._dirty))
+        # Take a shallow copy of each pending transaction so we know which
+        # items the child committed; anything put into a transaction after
+        # this will be committed by a later snapshot.
+        committing = [(store, store._transaction.copy())
+                      for store in self._stores._stores.values()
+                      if store.pending]
+        # Everything journaled so far will be in this snapshot, so start a
+        # new segment for anything that changes while it's being saved.
+        segments = self._journal.rotate() if self._journal else ()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            # This is the child process; nothing is coming back here, so
+            # don't let the garbage collector dirty any more shared pages
+            # than it needs to.
+            gc.disable()
+            try:
+                for instance, serial in saving:
+                    instance.save()
+                self._stores.commit()
+            except BaseException:
+                log.exception("Background snapshot failed.")
+                os._exit(1)
+            os._exit(0)
+        self._child = pid
+        self._saving = saving
+        self._committing = committing
+        self._segments = segments
+        self._started = started
+        self.last_pause = now() - started
+        log.debug("Forked process %s to save %s dirty entities"
+                  " (paused %.1fms).", pid, len(saving),
+                  self.last_pause * 1000)
+
+    def _finish(self, status):
+        """Clean up after a background snapshot child has exited.
+
+        :param int status: The exit status of the child process
+        :returns None:
+
+        """
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            for instance, serial in self._saving:
+                if instance._dirty == serial:
+                    # It didn't change again since the fork.
+                    instance._dirty = False
+            for store, items in self._committing:
+                transaction = store._transaction
+                for key, data in items.items():
+                    if key in transaction and transaction[key] is data:
+                        del transaction[key]
+            if self._journal:
+                self._journal.discard(self._segments)
+            log.debug("Background snapshot of %s entities finished"
+                      " in %.2fs.", len(self._saving), now() - self._started)
+        else:
+            log.error("Background snapshot process %s failed with status %s,"
+                      " its entities will be saved again.",
+                      self._child, status)
+        self._child = None
+        self._saving = ()
+        self._committing = ()
+        self._segments = ()
+
+    def poll(self):
+        """Check if a background snapshot has finished."""
+        if self._child is None:
+            return
+        pid, status = os.waitpid(self._child, os.WNOHANG)
+        if pid:
+            self._finish(status)
+
+    def wait(self):
+        """Wait until any background snapshot has finished."""
+        if self._child is None:
+            return
+        pid, status = os.waitpid(self._child, 0)
+        self._finish(status)
+
+
+# We create a global SnapshotManager here for convenience, and while the
+# server will generally only need one to work with, they are NOT singletons
+# and you can make more SnapshotManager instances if you like.
+SNAPSHOTS = SnapshotManager(journal=JOURNAL)
@@ -197,6 +197,24 @@ class DataStore:
         else:
             return default
 
+    def get_many(self, keys):
+        """Fetch data for several keys from the store.
+
+        Stores that can fetch a batch of keys faster than one at a time
+        should override this.
+
+        :param iterable keys: The keys of the data to fetch
+        :returns dict: The fetched data, keyed by key; keys that weren't
+                       found are left out
+
+        """
+        found = {}
+        for key in keys:
+            data = self.get(key, default=None)
+            if data is not None:
+                found[key] = data
+        return found
+
     def put(self, key, data):
         """Put data into the store.
 
@@ -169,7 +169,9 @@ class TimerManager:
 
     def pulse(self):
         """Pulse each timer once."""
-        for timer in self._timers.values():
+        # Timers can kill themselves (or others) when pulsed, so we can't
+        # iterate through the live dict.
+        for timer in list(self._timers.values()):
             timer.pulse()
 
     def sleep_excess(self, pulses=1):
@@ -26,7 +26,7 @@ class MyClass(HasFlags, HasWeaks, metaclass=_MyClassMeta):
 
 
 # noinspection PyProtectedMember
-class _FlagSet:
+class FlagSet:
 
     """A set of flags on an object.  Used by the HasFlags mix-in.
 
@@ -124,7 +124,7 @@ class HasFlagsMeta(type):
 
     def __init__(cls, name, bases, namespace):
         super().__init__(name, bases, namespace)
-        cls._flag_set = _FlagSet()
+        cls._flag_set = FlagSet()
 
     # noinspection PyDocstring
     @property
@@ -144,7 +144,7 @@ class HasFlags(metaclass=HasFlagsMeta):
 
     def __init__(self):
         super().__init__()
-        self._flag_set = _FlagSet(self)
+        self._flag_set = FlagSet(self)
 
     @property
     def flags(self):
@@ -20,6 +20,7 @@
 # Further changes made by Will Hutcheson (will@whutch.com)
 # for the Atria MUD Server (https://github.com/whutch/atria)
 
+from functools import lru_cache
 import socket
 import select
 import sys
@@ -148,6 +149,46 @@ class ConnectionLost(Exception):
     pass
 
 
+# What each token renders to, keyed by the character after the caret.
+# A doubled caret is an escaped literal caret.
+_ANSI_REPLACEMENTS = {token[1]: code for token, code in ANSI_CODES.items()}
+_STRIP_REPLACEMENTS = {token[1]: '' for token in ANSI_CODES}
+
+
+@lru_cache(maxsize=1024)
+def _render_caret_codes(text, ansi):
+    """Render the caret codes in a string in one pass, caching the results.
+
+    Prompts, room titles, map tiles and the like are rendered over and
+    over with the same text, so they'll usually be found in the cache.
+
+    :param str text: The text to render
+    :param bool ansi: Whether to replace the codes with ANSI sequences or
+                      strip them out
+    :returns str: The rendered text
+
+    """
+    replacements = _ANSI_REPLACEMENTS if ansi else _STRIP_REPLACEMENTS
+    parts = text.split('^')
+    rendered = [parts[0]]
+    parts = iter(parts[1:])
+    for part in parts:
+        if not part:
+            # An escaped caret (or a trailing one), so the text after it
+            # is left as is.
+            rendered.append('^')
+            rendered.append(next(parts, ''))
+            continue
+        code = replacements.get(part[0])
+        if code is None:
+            rendered.append('^')
+            rendered.append(part)
+        else:
+            rendered.append(code)
+            rendered.append(part[1:])
+    return ''.join(rendered)
+
+
 def strip_caret_codes(text):
     """Strip out any caret codes from a string.
 
@@ -155,10 +196,9 @@ def strip_caret_codes(text):
     :returns str: The clean text
 
     """
-    text = text.replace('^^', '\x00')
-    for token, foo in ANSI_CODES.items():
-        text = text.replace(token, '')
-    return text.replace('\x00', '^')
+    if '^' not in text:
+        return text
+    return _render_caret_codes(text, False)
 
 
 def colorize(text, ansi=True):
@@ -169,14 +209,20 @@ def colorize(text, ansi=True):
     :returns str: The colorized text
 
     """
-    if ansi:
-        text = text.replace('^^', '\x00')
-        for token, code in ANSI_CODES.items():
-            text = text.replace(token, code)
-        text = text.replace('\x00', '^')
-    else:
-        text = strip_caret_codes(text)
-    return text
+    if '^' not in text:
+        return text
+    return _render_caret_codes(text, bool(ansi))
+
+
+def encode_text(text):
+    """Convert newlines to CR/LF and encode text for sending.
+
+    :param str text: The text to encode
+    :returns bytes: The encoded text
+
+    """
+    # Convert to ANSI before sending.
+    return text.replace('\n', '\r\n').encode('cp1252')
 
 
 def word_wrap(text, columns=80, indent=4, padding=2):
@@ -240,7 +286,7 @@ class TelnetClient(object):
         self.columns = 80
         self.rows = 24
         self.send_pending = False
-        self.send_buffer = ''
+        self.send_buffer = bytearray()
         self.recv_buffer = ''
         self.bytes_sent = 0
         self.bytes_received = 0
@@ -289,7 +335,19 @@ class TelnetClient(object):
 
         """
         if text:
-            self.send_buffer += text.replace('\n', '\r\n')
+            self.send_raw(encode_text(text))
+
+    def send_raw(self, data):
+        """Send bytes that are already encoded, as they are.
+
+        This lets the same rendered output be shared between many clients.
+
+        :param bytes data: The data to send
+        :returns None:
+
+        """
+        if data:
+            self.send_buffer += data
             self.send_pending = True
 
     def send_cc(self, text):
@@ -408,15 +466,14 @@ class TelnetClient(object):
         """
         if len(self.send_buffer):
             try:
-                # Convert to ANSI before sending.
-                sent = self.sock.send(bytes(self.send_buffer, "cp1252"))
+                sent = self.sock.send(self.send_buffer)
             except socket.error as err:
                 logging.error("SEND error '{}' from {}".format(
                     err, self.addrport()))
                 self.active = False
                 return
             self.bytes_sent += sent
-            self.send_buffer = self.send_buffer[sent:]
+            del self.send_buffer[:sent]
         else:
             self.send_pending = False
 
@@ -480,11 +537,11 @@ class TelnetClient(object):
     def _echo_byte(self, byte):
         """Echo a character back to the client and convert LF into CR\LF."""
         if byte == '\n':
-            self.send_buffer += '\r'
+            self.send_buffer += b'\r'
         if self.telnet_echo_password:
-            self.send_buffer += '*'
+            self.send_buffer += b'*'
         else:
-            self.send_buffer += byte
+            self.send_buffer += byte.encode('cp1252')
 
     def _iac_sniffer(self, byte):
         """Check incoming data for Telnet IAC sequences.
@@ -758,7 +815,8 @@ class TelnetServer(object):
 
     def __init__(self, port=23, address='', on_connect=None,
                  on_disconnect=None, max_connections=MAX_CONNECTIONS,
-                 timeout=0.1, server_socket=None, create_client=True):
+                 timeout=0.1, server_socket=None, create_client=True,
+                 on_receive=None):
         """ Create a new Telnet server.
 
         :param int port: The port to listen for new connection on; on
@@ -778,12 +836,15 @@ class TelnetServer(object):
         :param bool create_client: Whether to create new client instances or
                                    pass the incoming sockets directly to the
                                    on_connect callback
+        :param callable on_receive: Callback for when a client has received
+                                    a full line of input
 
         """
         self.port = port
         self.address = address
         self.on_connect = on_connect
         self.on_disconnect = on_disconnect
+        self.on_receive = on_receive
         self.max_connections = min(max_connections, MAX_CONNECTIONS)
         self.timeout = timeout
         self.create_client = create_client
@@ -912,8 +973,11 @@ class TelnetServer(object):
 
             else:
                 # Call the connection's receive method.
+                client = self.clients[sock_fileno]
                 try:
-                    self.clients[sock_fileno].socket_recv()
+                    client.socket_recv()
+                    if self.on_receive and client.cmd_ready:
+                        self.on_receive(client)
                 except ConnectionLost:
                     self.clients[sock_fileno].deactivate()
                     # Don't wait another poll to do this.. -WH
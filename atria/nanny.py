@@ -4,14 +4,19 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
+import faulthandler
 from multiprocessing import Process, Queue, Value
-from time import sleep
+from os import kill, remove
+from os.path import dirname, exists, join
+import signal
+from time import sleep, time as now
 
 import redis
 
 # Note: Any modules imported here are not reloadable by the game server,
 # you'll need to do a full reboot to reload changes to them.
 from . import __version__, settings
+from .core.const import PHASE_BOOT, PHASE_NAMES
 from .core.logs import get_logger
 from .libs.miniboa import TelnetServer
 
@@ -26,12 +31,24 @@ servers = {}
 listener = None
 
 
+def _get_stack_dump_path(pid):
+    return join(dirname(settings.LOG_PATH), "stack-{}.txt".format(pid))
+
+
 class ServerProcess:
 
     """A game server process."""
 
     def __init__(self):
         self._process = None
+        # Shared memory values that the game server process updates every
+        # pulse, so we can tell if it has stalled.
+        self._heartbeat = None
+        self._phase = None
+        self._last_beat = 0
+        self._last_beat_time = None
+        self._stall_reported = False
+        self._dump_pending = False
 
     @property
     def pid(self):
@@ -48,15 +65,39 @@ class ServerProcess:
         """Return whether this process is alive."""
         return self._process.is_alive()
 
+    @property
+    def phase(self):
+        """Return the name of the loop phase this process is in."""
+        return PHASE_NAMES.get(self._phase.value, "unknown")
+
     @staticmethod
-    def _start(pid, _socket_queue, reload_from=None):
+    def _start(pid, heartbeat, phase, _socket_queue, reload_from=None):
         from .core.server import SERVER
         # Wait for our pid.
         while not pid.value:  # pragma: no cover
             continue
         SERVER._pid = pid.value
-        SERVER.boot(_socket_queue, reload_from)
-        SERVER.loop()
+        SERVER._heartbeat = heartbeat
+        SERVER._phase = phase
+        # Let the nanny ask us for a stack dump if we stall; faulthandler
+        # writes it from the signal handler, so this works even if the
+        # interpreter is stuck.
+        stack_file = None
+        if hasattr(signal, "SIGUSR1"):  # pragma: no cover
+            # Unregistering restores the previous handler, and a request
+            # that arrives after that (while shutting down or reloading)
+            # shouldn't kill the process, so it's ignored from now on.
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            stack_file = open(_get_stack_dump_path(pid.value), "a")
+            faulthandler.register(signal.SIGUSR1, file=stack_file,
+                                  all_threads=True)
+        try:
+            SERVER.boot(_socket_queue, reload_from)
+            SERVER.loop()
+        finally:
+            if stack_file:  # pragma: no cover
+                faulthandler.unregister(signal.SIGUSR1)
+                stack_file.close()
 
     def start(self, reload_from=None):
         """Start this server process.
@@ -68,12 +109,65 @@ class ServerProcess:
         """
         assert not self._process, "server instance already started"
         pid = Value("i")
+        self._heartbeat = Value("L", 0, lock=False)
+        self._phase = Value("i", PHASE_BOOT, lock=False)
         self._process = Process(target=self._start,
-                                args=(pid, socket_queue),
+                                args=(pid, self._heartbeat, self._phase,
+                                      socket_queue),
                                 kwargs={"reload_from": reload_from})
         self._process.start()
         pid.value = self._process.pid
 
+    def terminate(self):
+        """Forcibly stop this server process."""
+        self._process.terminate()
+        self._process.join(1)
+
+    def check_stall(self, _now=None):
+        """Check how long this process's heartbeat has been stalled.
+
+        A process that hasn't started beating yet is still booting and is
+        never considered stalled.
+
+        :param float _now: Optional, the current time (for testing)
+        :returns float: The time since the last heartbeat, in seconds
+
+        """
+        if _now is None:
+            _now = now()
+        beat = self._heartbeat.value
+        if not beat or beat != self._last_beat:
+            self._last_beat = beat
+            self._last_beat_time = _now
+            return 0
+        return _now - self._last_beat_time
+
+    def request_stack_dump(self):
+        """Ask this process to dump the stack of all its threads."""
+        if hasattr(signal, "SIGUSR1") and self.alive:  # pragma: no cover
+            kill(self.pid, signal.SIGUSR1)
+            self._dump_pending = True
+
+    def read_stack_dump(self):
+        """Read and clear a stack dump written by this process.
+
+        :returns str: The stack dump, or an empty string if there isn't one
+
+        """
+        path = _get_stack_dump_path(self.pid)
+        if not exists(path):
+            return ""
+        with open(path, "r+") as dump_file:
+            dump = dump_file.read()
+            dump_file.truncate(0)
+        return dump.strip()
+
+    def clean_up(self):
+        """Remove any files left behind by this process."""
+        path = _get_stack_dump_path(self.pid)
+        if exists(path):
+            remove(path)
+
 
 def _on_connect(new_socket, addr_port):  # pragma: no cover
     socket_queue.put((new_socket, addr_port))
@@ -91,6 +185,38 @@ def _handle_reload_request(msg):
     servers[new_server.pid] = new_server
 
 
+# noinspection PyProtectedMember
+def _check_stalls():
+    """Check the game server processes for stalled heartbeats."""
+    restart = []
+    for server in servers.values():
+        stalled = server.check_stall()
+        if stalled < settings.STALL_THRESHOLD:
+            if server._stall_reported:
+                log.info("Process %s has recovered from a stall.", server.pid)
+                server._stall_reported = False
+            continue
+        if not server._stall_reported:
+            log.warning("Process %s has stalled for %.1f seconds during"
+                        " phase '%s'.", server.pid, stalled, server.phase)
+            server._stall_reported = True
+            server.request_stack_dump()
+        elif server._dump_pending:
+            dump = server.read_stack_dump()
+            if dump:
+                log.warning("Stack dump for process %s:\n%s",
+                            server.pid, dump)
+                server._dump_pending = False
+        if settings.STALL_RECOVER and stalled >= settings.STALL_RECOVER_TIME:
+            restart.append(server)
+    for server in restart:
+        log.error("Process %s stalled for too long, restarting.", server.pid)
+        server.terminate()
+        new_server = ServerProcess()
+        new_server.start()
+        servers[new_server.pid] = new_server
+
+
 def start_nanny():
     """Start the nanny process and listen for sockets."""
     global listener
@@ -113,10 +239,12 @@ def start_nanny():
                               server.pid, server.exit_code)
                     dead_servers.append(server)
             for server in dead_servers:
+                server.clean_up()
                 del servers[server.pid]
             if not servers:
                 log.info("No servers running, goodbye.")
                 break
+            _check_stalls()
             listener.poll()
             channels.get_message()
             sleep(0.1)
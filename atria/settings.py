@@ -20,6 +20,17 @@ BIND_ADDRESS = "127.0.0.1"
 BIND_PORT = 4000
 IDLE_TIME = 180  # seconds
 IDLE_TIME_MAX = 600  # seconds
+# How much queued output a session can send in one pulse, anything past
+# that is held over to the next pulse.  Set either to 0 for no limit.
+# This counts characters of text before it's rendered (color codes and line
+# endings can make it a little longer on the wire).
+OUTPUT_CHARS_PER_PULSE = 16384
+OUTPUT_CHUNKS_PER_PULSE = 200  # How many queued sends to render
+# How many commands a session can run in one pulse, lag permitting.
+COMMANDS_PER_PULSE = 4
+# Commands that take longer than this to execute are logged with their
+# arguments.  Set to 0 to not log any.
+SLOW_COMMAND_TIME = 0.1  # seconds
 
 # Logging
 LOG_PATH = join(ROOT_DIR, "logs", "mud.log")
@@ -29,8 +40,17 @@ LOG_ROTATE_WHEN = "midnight"
 LOG_ROTATE_INTERVAL = 1
 LOG_UTC_TIMES = False
 
+# Watchdog
+STALL_THRESHOLD = 5  # seconds
+STALL_RECOVER = False  # Whether to restart a stalled server process
+STALL_RECOVER_TIME = 60  # seconds
+
 # Storage
 DATA_DIR = join(ROOT_DIR, "data")
+BACKGROUND_SAVES = False  # Whether to save from a forked process
+JOURNAL_CHANGES = False  # Whether to journal changes between saves
+PREFETCH_KEYS = 2000  # How many cached entities to reload after a restart
+PREFETCH_PER_PULSE = 25
 
 # Optional modules
 INCLUDE_MODULES = [
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for performance-sensitive parts of the server.
+
+Each benchmark is a module that can be run on its own, like so:
+
+    python -m benchmarks.bench_snapshots
+
+Importing this package points the log and data paths at a temporary
+directory (removed at exit), so benchmarks never touch real game data.
+
+"""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+import atexit
+import logging
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+from atria import settings
+
+
+_temp_dir = mkdtemp(prefix="atria-bench-")
+atexit.register(rmtree, _temp_dir, ignore_errors=True)
+
+settings.LOG_PATH = join(_temp_dir, "logs", "mud.log")
+settings.DATA_DIR = join(_temp_dir, "data")
+
+# Logging would only skew the timings.
+logging.disable(logging.INFO)
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    """Time how long it takes to call a function.
+
+    :param callable func: The function to time
+    :param args: Positional arguments to pass to the function
+    :param int repeat: How many times to call the function
+    :param kwargs: Keyword arguments to pass to the function
+    :returns float: The best time of any one call, in seconds
+
+    """
+    best = None
+    for _ in range(repeat):
+        started = perf_counter()
+        func(*args, **kwargs)
+        elapsed = perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(name, seconds, per=None):
+    """Print the result of a benchmark.
+
+    :param str name: The name of what was measured
+    :param float seconds: How long it took, in seconds
+    :param int per: If given, also show the time per this many operations
+    :returns None:
+
+    """
+    line = "{:<40} {:>10.3f}ms".format(name, seconds * 1000)
+    if per:
+        line += " {:>10.3f}us/op".format(seconds * 1000000 / per)
+    print(line)
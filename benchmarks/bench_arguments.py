@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Benchmark parsing client input into arguments."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from . import report, timed
+from atria.core.shells import Shell
+
+
+_LINES = (
+    "look",
+    "get sword",
+    "give 'long sword' bob",
+    "put all.coins in \"bag of holding\"",
+    "tell bob `hey there, how's it going?`",
+    "goto 10,20,0",
+    "  cast 'magic missile'   goblin  ",
+)
+
+
+def _parse_lines(lines, count):
+    for _ in range(count):
+        for line in lines:
+            Shell._get_arguments(line)
+
+
+def _parse_verbs(lines, count):
+    for _ in range(count):
+        for line in lines:
+            Shell._one_argument(line)
+
+
+def main():
+    count = 10000
+    per = count * len(_LINES)
+    report("arguments of typical commands",
+           timed(_parse_lines, _LINES, count, repeat=3), per=per)
+    report("verbs of typical commands",
+           timed(_parse_verbs, _LINES, count, repeat=3), per=per)
+    for words in (50, 500):
+        line = " ".join("word{}".format(n) for n in range(words))
+        report("arguments of a {} word line".format(words),
+               timed(_parse_lines, (line,), 100, repeat=3), per=100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Benchmark sending a channel message to lots of sessions."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from itertools import count
+
+from . import report, timed
+from atria.core.channels import Channel
+from atria.core.sessions import SESSIONS
+from atria.libs.miniboa import TelnetClient
+
+
+_filenos = count(10000)
+
+
+# noinspection PyDocstring
+class _FakeSocket:
+
+    def __init__(self):
+        self._fileno = next(_filenos)
+
+    def fileno(self):
+        return self._fileno
+
+    def close(self):
+        pass
+
+
+_MESSAGE = ("The server will be going down for maintenance in five "
+            "minutes, so please find somewhere safe to ^Rlog out^W and "
+            "we'll see you all again shortly.")
+
+
+_serials = count()
+
+
+def _announce(channel, clients, messages):
+    for _ in range(messages):
+        # Real messages are rarely the same twice, so don't let any caches
+        # hide the cost of rendering them.
+        channel.send(_MESSAGE, next(_serials))
+        SESSIONS.poll(output_only=True)
+    for client in clients:
+        client.send_buffer = client.send_buffer[:0]
+
+
+def main():
+    messages = 10
+    for sessions in (100, 500, 2000):
+        clients = []
+        for n in range(sessions):
+            client = TelnetClient(_FakeSocket(), ("127.0.0.1", 20000 + n))
+            clients.append(client)
+            session = SESSIONS.create(client)
+            # A realistic mix of color settings and screen widths.
+            session.color = bool(n % 2)
+            session.width = 80 if n % 3 else 100
+        channel = Channel("^Y[ANNOUNCE]^W {msg}^~",
+                          members=[SESSIONS.find_by_client(client)
+                                   for client in clients])
+        report("announce to {} sessions".format(sessions),
+               timed(_announce, channel, clients, messages, repeat=3),
+               per=sessions * messages)
+        for client in clients:
+            client.active = False
+            # As the server does when a client disconnects.
+            SESSIONS.find_by_client(client).wake()
+        SESSIONS.poll(output_only=True)
+        SESSIONS.prune()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Benchmark rendering caret color codes."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from . import report, timed
+from atria.libs.miniboa import (ANSI_CODES, colorize, strip_caret_codes,
+                                _render_caret_codes)
+
+
+def _replace_codes(text, ansi):
+    """Render caret codes the old way, one token at a time."""
+    text = text.replace("^^", "\x00")
+    for token, code in ANSI_CODES.items():
+        text = text.replace(token, code if ansi else "")
+    return text.replace("\x00", "^")
+
+
+_MESSAGES = {
+    "prompt": "^y<^W100^y/^W100hp ^W50^y/^W50mp^y>^~ ",
+    "room title": "^Y[ ^WThe Town Square ^Y]^~",
+    "map tile": "^G^2.^~",
+    "plain": "You don't see that here.",
+    "long": ("^cThe ^Wold man^c says, '^wI remember when this whole "
+             "valley was nothing but ^Gfarmland^w, as far as the eye "
+             "could see.^c'^~\n") * 4,
+}
+
+
+def _strip(text, ansi):
+    return strip_caret_codes(text)
+
+
+def _render_all(func, ansi, count):
+    for _ in range(count):
+        for text in _MESSAGES.values():
+            func(text, ansi)
+
+
+def _render_unique(func, ansi, count):
+    # Distinct strings every time, so nothing comes from the cache.
+    for n in range(count):
+        func("^Y[ ^WRoom number {} ^Y]^~".format(n), ansi)
+
+
+def main():
+    count = 20000
+    per = count * len(_MESSAGES)
+    for ansi in (True, False):
+        label = "colorize" if ansi else "strip"
+        func = colorize if ansi else _strip
+        report("{}, replacing each token".format(label),
+               timed(_render_all, _replace_codes, ansi, count, repeat=3),
+               per=per)
+        report("{}, single pass, cached".format(label),
+               timed(_render_all, func, ansi, count, repeat=3), per=per)
+        _render_caret_codes.cache_clear()
+        report("{} unique, replacing each token".format(label),
+               timed(_render_unique, _replace_codes, ansi, count, repeat=3),
+               per=count)
+        report("{} unique, single pass".format(label),
+               timed(_render_unique, func, ansi, count, repeat=3), per=count)
+
+
+if __name__ == "__main__":
+    main()
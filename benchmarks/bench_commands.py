@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the overhead of running a command."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from . import report, timed
+from atria.core.commands import Command
+from atria.core.shells import Shell
+
+
+# noinspection PyDocstring
+class _FakeSession:
+
+    def send(self, *args, **kwargs):
+        pass
+
+
+class _NothingCommand(Command):
+
+    """A command that does nothing, so only the overhead is measured."""
+
+    def _action(self):
+        pass
+
+
+class _BenchShell(Shell):
+    pass
+
+
+_BenchShell.add_verbs(_NothingCommand, "nothing")
+
+
+def _execute(session, count):
+    for _ in range(count):
+        _NothingCommand(session, ["an", "argument"]).execute()
+
+
+def _parse(shell, count):
+    for _ in range(count):
+        shell.parse("nothing an argument")
+
+
+def main():
+    count = 100000
+    session = _FakeSession()
+    report("create and execute a command",
+           timed(_execute, session, count, repeat=3), per=count)
+    shell = _BenchShell()
+    shell._set_weak("session", session)
+    report("parse and execute a line of input",
+           timed(_parse, shell, count, repeat=3), per=count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the cost of firing events."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from time import perf_counter
+
+from . import report, timed
+from atria.core.events import EventManager
+
+
+def _callback(*args):
+    pass
+
+
+def _fire_with(events, event_name, count):
+    for _ in range(count):
+        with events.fire(event_name, 1, 2):
+            pass
+
+
+def _fire_now(events, event_name, count):
+    for _ in range(count):
+        events.fire(event_name, 1, 2).now()
+
+
+def _hook_chain(count):
+    """Hook a chain of callbacks that each come after the next one hooked."""
+    events = EventManager()
+    for n in range(count, 0, -1):
+        events.hook("chain", "hook_{}".format(n), _callback,
+                    after="hook_{}".format(n - 1))
+    events.fire("chain").now()
+
+
+def _unhook_namespace(events_count, hooks_count):
+    """Unhook a namespace that owns a few hooks among a lot of others."""
+    events = EventManager()
+    for n in range(events_count):
+        event_name = "event_{}".format(n)
+        for m in range(hooks_count):
+            events.hook(event_name, "module_{}".format(m), _callback)
+    for n in range(5):
+        events.hook("event_{}".format(n), "plugin", _callback)
+    started = perf_counter()
+    events.unhook("*", "plugin")
+    return perf_counter() - started
+
+
+def main():
+    for hooks in (100, 500):
+        report("hook and fire a chain of {} hooks".format(hooks),
+               timed(_hook_chain, hooks), per=hooks)
+    report("unhook a namespace from 1000 events of 20 hooks",
+           _unhook_namespace(1000, 20))
+
+    count = 100000
+    events = EventManager()
+    for hooks in (0, 1, 20):
+        event_name = "bench_{}".format(hooks)
+        for n in range(hooks):
+            # Half pre-hooks, half post-hooks.
+            events.hook(event_name, "hook_{}".format(n), _callback,
+                        pre=bool(n % 2))
+        report("fire with context, {} hooks".format(hooks),
+               timed(_fire_with, events, event_name, count, repeat=3),
+               per=count)
+        report("fire now, {} hooks".format(hooks),
+               timed(_fire_now, events, event_name, count, repeat=3),
+               per=count)
+    # And with profiling turned on, for comparison.
+    events.profiling = True
+    report("fire now, 20 hooks, profiling",
+           timed(_fire_now, events, "bench_20", count, repeat=3), per=count)
+
+
+if __name__ == "__main__":
+    main()
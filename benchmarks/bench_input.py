@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Benchmark how quickly a burst of input from a session is worked off."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from . import report
+from atria.core.sessions import SESSIONS
+from atria.core.shells import EchoShell
+from atria.core.timing import PULSE_PER_SECOND
+from atria.libs.miniboa import TelnetClient
+
+
+# noinspection PyDocstring
+class _FakeSocket:
+
+    def fileno(self):
+        return 40000
+
+    def close(self):
+        pass
+
+
+def main():
+    client = TelnetClient(_FakeSocket(), ("127.0.0.1", 40000))
+    session = SESSIONS.create(client, EchoShell)
+    SESSIONS.poll()
+    for count in (10, 50):
+        # Like a pasted batch of commands arriving all at once.
+        client.command_list.extend("say {}".format(n) for n in range(count))
+        client.cmd_ready = True
+        session.wake()
+        pulses = 0
+        while client.cmd_ready:
+            SESSIONS.poll()
+            client.send_buffer = client.send_buffer[:0]
+            pulses += 1
+        report("{} commands, {} pulses".format(count, pulses),
+               pulses / PULSE_PER_SECOND)
+
+
+if __name__ == "__main__":
+    main()
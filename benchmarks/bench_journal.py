@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the change journal's per-pulse overhead and recovery time."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from time import perf_counter
+
+from . import report
+from atria.core.journal import JOURNAL
+from atria.core.world import Room
+
+
+def _make_rooms(count):
+    return [Room({"x": n, "y": 1, "z": 0,
+                  "name": "Room",
+                  "description": "A room for benchmarking. " * 8})
+            for n in range(count)]
+
+
+def _bench_flush(rooms, changed, pulses=100):
+    """Time flushing a pulse where some number of rooms changed."""
+    total = 0
+    for pulse in range(pulses):
+        for room in rooms[:changed]:
+            room.description = "Changed on pulse {}.".format(pulse)
+        started = perf_counter()
+        JOURNAL.flush()
+        total += perf_counter() - started
+    report("flush, {} changes per pulse".format(changed),
+           total / pulses, per=changed)
+
+
+def _bench_replay(rooms, pulses):
+    """Time replaying a journal after a simulated crash."""
+    for pulse in range(pulses):
+        for room in rooms:
+            room.description = "Changed on pulse {}.".format(pulse)
+        JOURNAL.flush()
+    JOURNAL.close()
+    for room in rooms:
+        room._dirty = False
+    Room._store.abort()
+    count = pulses * len(rooms)
+    started = perf_counter()
+    JOURNAL.replay()
+    report("replay, {} records".format(count),
+           perf_counter() - started, per=count)
+    JOURNAL.open()
+
+
+def main():
+    rooms = _make_rooms(1000)
+    # Measure the cost of the change tracking itself first.
+    started = perf_counter()
+    for room in rooms:
+        room.dirty()
+    report("dirty 1000 rooms, not journaling", perf_counter() - started,
+           per=len(rooms))
+    JOURNAL.open()
+    started = perf_counter()
+    for room in rooms:
+        room.dirty()
+    report("dirty 1000 rooms, journaling", perf_counter() - started,
+           per=len(rooms))
+    JOURNAL.flush()
+    for changed in (10, 100, 1000):
+        _bench_flush(rooms, changed)
+    # Start the replays from an empty journal.
+    JOURNAL.truncate()
+    for pulses in (1, 10, 50):
+        _bench_replay(rooms, pulses)
+    JOURNAL.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Benchmark finding clients and sessions with lots of connections."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from . import report, timed
+from atria.core.net import CLIENTS
+from atria.core.sessions import SESSIONS
+
+
+# noinspection PyDocstring
+class _FakeClient:
+
+    def __init__(self, port):
+        self.active = True
+        self.address = "127.0.0.1"
+        self.port = port
+        self.fileno = port
+        self.use_ansi = False
+
+    # noinspection PyMethodMayBeStatic,PyDocstring
+    def idle(self):
+        return 0
+
+    # noinspection PyPep8Naming,PyDocstring
+    class sock:
+
+        @staticmethod
+        def close():
+            pass
+
+
+def _find_clients(ports):
+    for port in ports:
+        CLIENTS.find_by_port(port)
+
+
+def _find_sessions(clients):
+    for client in clients:
+        SESSIONS.find_by_client(client)
+
+
+def main():
+    CLIENTS.listen("127.0.0.1", 0, lambda c: None, lambda c: None,
+                   server_socket=0)
+    for count in (100, 1000, 10000):
+        clients = CLIENTS._server.clients
+        clients.clear()
+        SESSIONS._sessions.clear()
+        SESSIONS._clients.clear()
+        SESSIONS._filenos.clear()
+        for port in range(10000, 10000 + count):
+            client = _FakeClient(port)
+            clients[client.fileno] = client
+            SESSIONS.create(client)
+        # Look up a spread of them, from the first to the last.
+        step = max(count // 100, 1)
+        ports = range(10000, 10000 + count, step)
+        report("find client by port, {} clients".format(count),
+               timed(_find_clients, ports, repeat=3), per=len(ports))
+        sample = [clients[port] for port in ports]
+        report("find session by client, {} sessions".format(count),
+               timed(_find_sessions, sample, repeat=3), per=len(sample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Benchmark how fast session output can be rendered for a client."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from time import perf_counter
+
+from atria import settings
+from atria.core.sessions import SESSIONS
+from atria.libs.miniboa import TelnetClient
+
+
+# noinspection PyDocstring
+class _FakeSocket:
+
+    def fileno(self):
+        return 30000
+
+    def close(self):
+        pass
+
+
+_WORDS = ("The ^Rred^~ dragon", "sleeps", "on a pile of", "^Ygold^~", "and",
+          "old bones,", "snoring", "loudly.")
+
+
+def _make_lines(count, words, unique):
+    lines = []
+    for n in range(count):
+        line = " ".join(_WORDS[(n + m) % len(_WORDS)] for m in range(words))
+        if unique:
+            line = "{} {}".format(n, line)
+        lines.append(line)
+    return lines
+
+
+def _flush(session, lines, sends):
+    """Send lines to a session and poll it, returning the bytes per second."""
+    client = session._client
+    total_bytes = 0
+    total_time = 0
+    for n in range(0, len(lines), sends):
+        for line in lines[n:n + sends]:
+            session.send(line)
+        started = perf_counter()
+        session.poll(output_only=True)
+        total_time += perf_counter() - started
+        total_bytes += len(client.send_buffer)
+        client.send_buffer = client.send_buffer[:0]
+    return total_bytes / total_time
+
+
+def _report(name, rate):
+    print("{:<44} {:>8.2f} MB/s".format(name, rate / 1000000))
+
+
+def main():
+    # Let everything through in one poll, to find the ceiling.
+    settings.OUTPUT_CHARS_PER_PULSE = 0
+    settings.OUTPUT_CHUNKS_PER_PULSE = 0
+    client = TelnetClient(_FakeSocket(), ("127.0.0.1", 30000))
+    session = SESSIONS.create(client)
+    for color in (False, True):
+        session.color = color
+        suffix = ", color" if color else ""
+        for words, name in ((3, "short"), (40, "long")):
+            for unique in (False, True):
+                lines = _make_lines(20000, words, unique)
+                best = max(_flush(session, lines, 100) for _ in range(3))
+                _report("{} {} lines{}".format(
+                    "unique" if unique else "repeated", name, suffix), best)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Benchmark polling sessions when most of them are idle."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from itertools import count
+from time import perf_counter
+
+from . import report, timed
+from atria.core.sessions import SESSIONS
+from atria.libs.miniboa import TelnetClient
+
+
+_filenos = count(10000)
+
+
+# noinspection PyDocstring
+class _FakeSocket:
+
+    def __init__(self):
+        self._fileno = next(_filenos)
+
+    def fileno(self):
+        return self._fileno
+
+    def close(self):
+        pass
+
+
+def _poll(pulses):
+    for _ in range(pulses):
+        SESSIONS.poll()
+
+
+def _poll_and_prune(pulses):
+    for _ in range(pulses):
+        SESSIONS.poll()
+        SESSIONS.prune()
+
+
+def main():
+    pulses = 100
+    clients = []
+    for sessions in (500, 5000):
+        while len(clients) < sessions:
+            client = TelnetClient(_FakeSocket(),
+                                  ("127.0.0.1", 20000 + len(clients)))
+            clients.append(client)
+            SESSIONS.create(client)
+        # Let them all settle down after connecting.
+        SESSIONS.poll()
+        for client in clients:
+            client.send_buffer = client.send_buffer[:0]
+        report("poll {} idle sessions".format(sessions),
+               timed(_poll, pulses, repeat=3), per=pulses)
+        report("poll and prune {} idle sessions".format(sessions),
+               timed(_poll_and_prune, pulses, repeat=3), per=pulses)
+        report("idle check, {} sessions".format(sessions),
+               timed(SESSIONS.check_idle, repeat=3))
+        # And now with a handful of them sending output.
+        for client in clients[:10]:
+            SESSIONS.find_by_client(client).send("Hello.")
+        report("poll {} sessions, 10 busy".format(sessions),
+               timed(_poll, 1, repeat=1))
+    # One session getting spammed while a few others have a little output,
+    # to see how long the slowest pulse takes and how long the others wait.
+    spammed = SESSIONS.find_by_client(clients[0])
+    for n in range(5000):
+        spammed.send("Spam, spam, spam, spam, lovely spam! ({})".format(n))
+    for client in clients[1:11]:
+        SESSIONS.find_by_client(client).send("Hello.")
+    pulses = 0
+    slowest = 0
+    started = perf_counter()
+    waited = None
+    while spammed._output_queue or pulses == 0:
+        pulse_started = perf_counter()
+        SESSIONS.poll()
+        slowest = max(slowest, perf_counter() - pulse_started)
+        pulses += 1
+        if waited is None:
+            waited = perf_counter() - started
+        for client in clients[:11]:
+            client.send_buffer = client.send_buffer[:0]
+    report("flush a 5000 line burst, slowest of {} pulses".format(pulses),
+           slowest)
+    report("wait for other output during the burst", waited)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Benchmark warming entity caches after a reload or restart."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from time import perf_counter
+
+from . import report
+from atria import settings
+from atria.core.entities import ENTITIES
+from atria.core.snapshots import SNAPSHOTS
+from atria.core.timing import TIMERS
+from atria.core.world import Room
+
+
+def _load_all(keys):
+    for key in keys:
+        Room.load(key)
+
+
+def main():
+    count = 500  # The size of the room key cache.
+    rooms = [Room({"x": n, "y": 2, "z": 0, "name": "Room",
+                   "description": "A room for benchmarking. " * 8})
+             for n in range(count)]
+    keys = [room.key for room in rooms]
+    SNAPSHOTS.save(background=False)
+    hot_keys = ENTITIES.get_hot_keys(settings.PREFETCH_KEYS)
+    del rooms
+    cache = Room._caches[Room.get_key_name()]
+
+    cache.clear()
+    started = perf_counter()
+    _load_all(keys)
+    report("cold lookups, {} rooms".format(count),
+           perf_counter() - started, per=count)
+
+    cache.clear()
+    ENTITIES.prefetch(hot_keys, settings.PREFETCH_PER_PULSE)
+    slowest = 0
+    pulses = 0
+    while "prefetch_entities" in TIMERS:
+        started = perf_counter()
+        TIMERS["prefetch_entities"].pulse()
+        slowest = max(slowest, perf_counter() - started)
+        pulses += 1
+    report("prefetch, slowest of {} pulses".format(pulses), slowest,
+           per=settings.PREFETCH_PER_PULSE)
+
+    started = perf_counter()
+    _load_all(keys)
+    report("warm lookups, {} rooms".format(count),
+           perf_counter() - started, per=count)
+
+
+if __name__ == "__main__":
+    main()
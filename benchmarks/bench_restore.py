@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Benchmark restoring sessions from a saved state after a reload."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from gc import collect
+from time import perf_counter
+
+from . import report
+from atria.core.accounts import Account
+from atria.core.characters import Character
+from atria.core.events import EVENTS
+from atria.core.net import CLIENTS
+from atria.core.sessions import SESSIONS
+from atria.core.snapshots import SNAPSHOTS
+
+
+# noinspection PyDocstring
+class _FakeClient:
+
+    def __init__(self, port):
+        self.active = True
+        self.address = "127.0.0.1"
+        self.port = port
+        self.fileno = port
+        self.use_ansi = False
+
+    # noinspection PyMethodMayBeStatic,PyDocstring
+    def idle(self):
+        return 0
+
+    # noinspection PyPep8Naming,PyDocstring
+    class sock:
+
+        @staticmethod
+        def close():
+            pass
+
+
+def _letters(n):
+    letters = ""
+    while True:
+        n, remainder = divmod(n, 26)
+        letters += chr(ord("a") + remainder)
+        if not n:
+            return letters
+
+
+def _make_state(count, start=0):
+    """Build a saved session state, with the accounts and characters."""
+    sessions = {}
+    entities = []  # Hold on to them until they're saved.
+    for n in range(start, start + count):
+        port = 10000 + n
+        email = "bench{}@example.com".format(n)
+        name = "Bench" + _letters(n)
+        entities.append(Account({"email": email, "name": "bench{}".format(n)}))
+        entities.append(Character({"name": name}))
+        sessions[port] = ([], None, None, email, name, 80, False)
+    SNAPSHOTS.save(background=False)
+    return {"sessions": sessions}
+
+
+def _restore(count, state):
+    """Time restoring a state into a fresh process's managers."""
+    # Start from empty managers and caches, like a new process would.
+    SESSIONS._sessions.clear()
+    SESSIONS._clients.clear()
+    SESSIONS._filenos.clear()
+    for entity in (Account, Character):
+        entity._caches[entity.get_key_name()].clear()
+    collect()
+    clients = CLIENTS._server.clients
+    clients.clear()
+    for port in state["sessions"]:
+        clients[port] = _FakeClient(port)
+    started = perf_counter()
+    EVENTS.fire("server_load_state", state).now()
+    report("restore {} sessions".format(count),
+           perf_counter() - started, per=count)
+    assert all(session.char for session in SESSIONS.all())
+    # Let go of everything before the next run.
+    for session in list(SESSIONS.all()):
+        session._char = None
+        session._account = None
+
+
+def main():
+    CLIENTS.listen("127.0.0.1", 0, lambda c: None, lambda c: None,
+                   server_socket=0)
+    start = 0
+    for count in (500, 1000, 2000, 5000):
+        state = _make_state(count, start)
+        _restore(count, state)
+        start += count
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the game loop pause caused by saving snapshots."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+import os
+
+from . import report
+from atria.core.snapshots import SNAPSHOTS
+from atria.core.world import Room
+
+
+def _make_rooms(count):
+    rooms = []
+    for n in range(count):
+        room = Room({"x": n, "y": 0, "z": 0,
+                     "name": "Room {}".format(n),
+                     "description": "A room for benchmarking. " * 8})
+        rooms.append(room)
+    return rooms
+
+
+def _dirty_all(rooms):
+    for room in rooms:
+        room.dirty()
+
+
+def main():
+    for count in (1000, 5000, 20000):
+        rooms = _make_rooms(count)
+        _dirty_all(rooms)
+        SNAPSHOTS.save(background=False)
+        report("foreground save, {} rooms".format(count),
+               SNAPSHOTS.last_pause, per=count)
+        if hasattr(os, "fork"):
+            _dirty_all(rooms)
+            SNAPSHOTS.save(background=True)
+            report("background save, {} rooms".format(count),
+                   SNAPSHOTS.last_pause, per=count)
+            SNAPSHOTS.wait()
+        del rooms
+
+
+if __name__ == "__main__":
+    main()
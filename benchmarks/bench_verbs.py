@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the memory and lookup time of a shell's verbs."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from random import Random
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from . import report, timed
+from atria.core.commands import Command
+from atria.core.shells import Shell
+
+
+def _make_verbs(count):
+    """Make up some distinct verbs, with a lot of shared prefixes."""
+    random = Random(46)
+    verbs = set()
+    while len(verbs) < count:
+        length = random.randint(3, 12)
+        verbs.add("".join(random.choice("abcdefghijklmnopqrst")
+                          for _ in range(length)))
+    return sorted(verbs, key=lambda verb: random.random())
+
+
+def _find_all(shell, verbs):
+    for verb in verbs:
+        shell.find_command(verb)
+
+
+def main():
+    for count in (100, 500, 2000):
+        verbs = _make_verbs(count)
+        commands = [type("BenchCommand{}".format(n), (Command,), {})
+                    for n in range(count)]
+        shell = type("BenchShell{}".format(count), (Shell,), {})
+        start()
+        started = perf_counter()
+        for command, verb in zip(commands, verbs):
+            shell.add_verbs(command, verb)
+        elapsed = perf_counter() - started
+        used = get_traced_memory()[0]
+        stop()
+        report("add {} verbs".format(count), elapsed, per=count)
+        print("{:<40} {:>10.1f}KB".format(
+            "memory for {} verbs".format(count), used / 1024))
+        abbreviations = [verb[:max(1, len(verb) // 2)] for verb in verbs]
+        misses = [verb + "zz" for verb in verbs]
+        for name, lookups in (("full verbs", verbs),
+                              ("abbreviations", abbreviations),
+                              ("misses", misses)):
+            report("find {}, {} verbs".format(name, count),
+                   timed(_find_all, shell, lookups, repeat=5),
+                   per=len(lookups))
+
+
+if __name__ == "__main__":
+    main()
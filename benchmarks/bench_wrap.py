@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Benchmark wrapping output to a session's width."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from . import report, timed
+from atria.core.sessions import Session
+
+
+_DESCRIPTION = ("^gThe square is paved with worn ^Wcobblestones^g, and a "
+                "dry fountain stands at its center. Merchants' stalls line "
+                "the edges, their ^Ycanvas awnings^g snapping in the wind. ")
+
+
+def _wrap_many(text, width, count):
+    for _ in range(count):
+        Session.wrap_to_width(text, width)
+
+
+def _wrap_unique(text, width, count):
+    # Distinct strings every time, so nothing comes from the cache.
+    for n in range(count):
+        Session.wrap_to_width(text + str(n), width)
+
+
+def main():
+    count = 2000
+    for repeats in (1, 10, 50):
+        text = _DESCRIPTION * repeats
+        report("wrap {} chars, repeated".format(len(text)),
+               timed(_wrap_many, text, 80, count, repeat=3), per=count)
+        report("wrap {} chars, unique".format(len(text)),
+               timed(_wrap_unique, text, 80, count // 10),
+               per=count // 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Tests for communication channels."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from atria.core.channels import Channel
+
+
+class _FakeSession:
+
+    color = False
+    width = 80
+
+    def __init__(self):
+        self.output = []
+
+    def send_raw(self, data):
+        self.output.append(data)
+
+
+class TestChannels:
+
+    """A collection of tests for communication channels."""
+
+    def test_channel_template(self):
+        """Test that simple templates are split around the message."""
+        channel = Channel("^Y[Test]^W {msg}^~")
+        assert channel._parts == ("^Y[Test]^W ", "^~")
+        channel.template = "{{{msg}}}"
+        assert channel._parts == ("{", "}")
+        channel.template = "^M[Test]^W {speaker}^w: {msg}^~"
+        assert channel._parts is None
+
+    def test_channel_send(self):
+        """Test that a message is sent once to every member."""
+        members = [_FakeSession(), _FakeSession()]
+        channel = Channel("^Y[Test]^W {msg}^~", members=members)
+        channel.send("Hello", "world.")
+        assert members[0].output == [b"[Test] Hello world.\r\n"]
+        assert members[1].output[0] is members[0].output[0]
+        channel = Channel("[{speaker}] {msg}", members=lambda: members)
+        channel.send("Hi.", context={"speaker": "Bob"})
+        assert members[1].output[1] == b"[Bob] Hi.\r\n"
@@ -17,6 +17,9 @@ from atria.core.world import Room
 
 class _FakeSession:
 
+    color = False
+    width = 80
+
     def __init__(self):
         self.account = None
         self._output = deque()
@@ -25,6 +28,11 @@ class _FakeSession:
     def send(self, data, *more, sep=" ", end="\n"):
         return self._output.append(joins(data, *more, sep=sep) + end)
 
+    def send_raw(self, data):
+        # Turn broadcast output back into what send would have queued.
+        text = data.decode("cp1252").replace("\r\n", "\n")
+        return self._output.append(text)
+
     def request(self, request_class, callback, **options):
         new_request = request_class(self, callback, **options)
         self._request_queue.append(new_request)
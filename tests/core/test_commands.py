@@ -6,7 +6,10 @@
 
 import pytest
 
-from atria.core.commands import AlreadyExists, Command, CommandManager
+from atria import settings
+from atria.core import commands as commands_module
+from atria.core.commands import (AlreadyExists, Command, CommandManager,
+                                 TIMING_BUCKETS)
 
 
 class TestCommands:
@@ -18,7 +21,12 @@ class TestCommands:
     command = None
 
     class _FakeSession:
-        pass
+
+        def __init__(self):
+            self.waited = 0
+
+        def wait(self, pulses):
+            self.waited += pulses
 
     session = _FakeSession()
 
@@ -47,6 +55,8 @@ class TestCommands:
 
             """A test command."""
 
+            __slots__ = ("called",)
+
             def __init__(self, session, args):
                 super().__init__(session, args)
                 self.called = False
@@ -85,6 +95,32 @@ class TestCommands:
         with pytest.raises(KeyError):
             self.commands["some_nonexistent_command"].process()
 
+    def test_command_manager_record_timing(self, monkeypatch):
+        """Test that we can record and report command timings."""
+        warned = []
+        monkeypatch.setattr(commands_module.log, "warn",
+                            lambda msg, *args: warned.append(args))
+        monkeypatch.setattr(settings, "SLOW_COMMAND_TIME", 0.1)
+        assert not self.commands.get_command_stats()
+        self.commands.record_timing(self.command_class, 0.002)
+        self.commands.record_timing(self.command_class, 0.004)
+        self.commands.record_timing(Command, 0.5, ["slowly"])
+        assert warned == [("Command", 500.0, ["slowly"])]
+        stats = self.commands.get_command_stats()
+        assert [stat[0] for stat in stats] == [Command, self.command_class]
+        command, calls, total, most, buckets = stats[1]
+        assert calls == 2 and most == 0.004
+        assert abs(total - 0.006) < 1e-9
+        assert len(buckets) == len(TIMING_BUCKETS) + 1
+        assert buckets[TIMING_BUCKETS.index(0.005)] == 2
+        assert sum(buckets) == 2
+        stats = self.commands.get_command_stats(1, sort_by="count")
+        assert [stat[0] for stat in stats] == [self.command_class]
+        with pytest.raises(ValueError):
+            self.commands.get_command_stats(sort_by="nope")
+        self.commands.reset_command_stats()
+        assert not self.commands.get_command_stats()
+
     def test_command_instance(self):
         """Test that we can create a command instance."""
         # noinspection PyCallingNonCallable
@@ -106,3 +142,29 @@ class TestCommands:
         """Test that we can execute a command."""
         self.command.execute()
         assert self.command.called
+        # It only holds on to its session while executing.
+        assert self.command.session is None
+
+    def test_command_execute_lag(self):
+        """Test that a command with lag puts its session in a wait state."""
+
+        class LaggyCommand(self.command_class):
+            lag = 3
+
+        LaggyCommand(self.session, ()).execute()
+        assert self.session.waited == 3
+
+    def test_command_slots(self):
+        """Test that command subclasses don't get instance dictionaries."""
+        command = self.command_class(self.session, ())
+        assert not hasattr(command, "__dict__")
+        with pytest.raises(AttributeError):
+            command.nope = True
+
+    def test_command_flags(self):
+        """Test that a command's flags are only made when first used."""
+        command = self.command_class(self.session, ())
+        assert not hasattr(command, "_flags")
+        command.flags.add("test")
+        assert command.flags.has("test")
+        assert command.flags._owner is command
@@ -6,8 +6,9 @@
 
 import pytest
 
-from atria.core.entities import Entity
+from atria.core.entities import Entity, EntityManager
 from atria.core.pickle import PickleStore
+from atria.core.timing import TIMERS
 
 
 class SomeEntity(Entity):
@@ -54,3 +55,54 @@ class TestEntities:
         another_copy = SomeEntity.load(key, default=None)
         assert another_copy and another_copy.uid
         assert another_copy.uid == uid
+
+    def test_entity_load_many(self):
+        """Test that we can load a batch of entities at once."""
+        loaded = SomeEntity()
+        stored = SomeEntity()
+        stored.save()
+        stored_key = stored.key
+        del stored
+        SomeEntity._caches["uid"].clear()
+        found = SomeEntity.load_many([loaded.key, stored_key, "nope"])
+        assert found[loaded.key] is loaded
+        assert found[stored_key].uid == stored_key
+        assert not found[stored_key].is_dirty
+        assert "nope" not in found
+        assert stored_key in SomeEntity._caches["uid"]
+
+    def test_entity_manager_get_hot_keys(self):
+        """Test that active entities are the hottest keys."""
+        manager = EntityManager()
+        manager.register(SomeEntity)
+        active = SomeEntity(active=True)
+        SomeEntity._caches["uid"].clear()
+        cached = [SomeEntity() for _ in range(3)]
+        hot_keys = manager.get_hot_keys()
+        assert hot_keys[0] == ("SomeEntity", active.key)
+        # The rest are from most to least recently cached.
+        assert hot_keys[1:] == [("SomeEntity", entity.key)
+                                for entity in reversed(cached)]
+        assert len(manager.get_hot_keys(limit=2)) == 2
+
+    def test_entity_manager_prefetch(self):
+        """Test that entities can be prefetched into the cache."""
+        manager = EntityManager()
+        manager.register(SomeEntity)
+        entities = [SomeEntity() for _ in range(3)]
+        keys = [("SomeEntity", entity.key) for entity in entities]
+        for entity in entities:
+            entity.save()
+        cache = SomeEntity._caches["uid"]
+        cache.clear()
+        del entities
+        timer = manager.prefetch(keys, per_pulse=2)
+        assert timer and timer.live
+        TIMERS.pulse()
+        assert len(cache) == 2
+        TIMERS.pulse()
+        assert len(cache) == 3
+        assert keys[0][1] in cache
+        TIMERS.pulse()
+        assert not timer.live
+        assert "prefetch_entities" not in TIMERS
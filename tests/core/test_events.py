@@ -209,6 +209,30 @@ class TestHooking:
             self.events.hook("test", "test2", callback=self._dummy_func,
                              after="test1")
 
+    def test_hook_before(self):
+        """Test hooking a callback before another namespace."""
+        event = self.events.get_or_make("before")
+        self.events.hook("before", "first", callback=self._dummy_func)
+        self.events.hook("before", "second", callback=self._dummy_func,
+                         before="first")
+        self.events.hook("before", "third", callback=self._dummy_func,
+                         after=("first", "second"), before="nope")
+        assert [hook.namespace for hook in event.hooks] == \
+            ["second", "first", "third"]
+
+    def test_hook_circular_message(self):
+        """Test that a circular hook order error names the cycle."""
+        self.events.hook("cycle", "a", callback=self._dummy_func,
+                         before="b")
+        self.events.hook("cycle", "b", callback=self._dummy_func,
+                         before="c")
+        with pytest.raises(OverflowError) as exc:
+            self.events.hook("cycle", "c", callback=self._dummy_func,
+                             before="a")
+        assert "c -> a -> b -> c" in str(exc.value)
+        # The failed hook wasn't added.
+        assert len(self.events.get_or_make("cycle").hooks) == 2
+
     def test_event_fire(self):
         """Test firing an event."""
         self.events.hook("test", callback=lambda: self.array.append(1),
@@ -228,3 +252,115 @@ class TestHooking:
         with pytest.raises(SyntaxError):
             with self.events.fire("test"):
                 raise SyntaxError()
+
+    def test_event_fire_no_hooks(self):
+        """Test firing an event with no hooks."""
+        with self.events.fire("no_hooks"):
+            self.array.append(2)
+        assert self.array[-1] == 2
+        with pytest.raises(SyntaxError):
+            with self.events.fire("no_hooks"):
+                raise SyntaxError()
+
+    def test_event_hook_while_fired(self):
+        """Test that post hooks hooked while an event is fired are called."""
+        called = []
+        # With no hooks at all when it was fired.
+        with self.events.fire("hooked_late"):
+            self.events.hook("hooked_late", "late",
+                             callback=lambda: called.append("first"))
+        assert called == ["first"]
+        # And with some hooks already.
+        with self.events.fire("hooked_late"):
+            self.events.hook("hooked_late", "later",
+                             callback=lambda: called.append("second"))
+        assert called == ["first", "first", "second"]
+        self.events.unhook("hooked_late")
+
+    def test_event_callbacks_rebuilt(self):
+        """Test that an event's callbacks are rebuilt when hooks change."""
+        event = self.events.get_or_make("callbacks")
+        self.events.hook("callbacks", "pre", callback=self._dummy_func,
+                         pre=True)
+        # Hooks aren't sorted until they're needed.
+        assert event.unsorted
+        event.sort_hooks()
+        assert event.pre_callbacks == (self._dummy_func,)
+        assert not event.post_callbacks
+        self.events.hook("callbacks", "post", callback=self._dummy_func)
+        self.events.fire("callbacks").now()
+        assert event.post_callbacks == (self._dummy_func,)
+        self.events.unhook("callbacks", "pre")
+        event.sort_hooks()
+        assert not event.pre_callbacks
+        assert event.post_callbacks == (self._dummy_func,)
+
+    def test_event_profiling(self):
+        """Test profiling the hooks of an event."""
+        self.events.hook("profiled", "test_profiling", self._dummy_func)
+        self.events.fire("profiled").now()
+        assert not self.events.get_hook_stats()
+        self.events.profiling = True
+        try:
+            self.events.fire("profiled").now()
+            self.events.fire("profiled").now()
+        finally:
+            self.events.profiling = False
+        stats = self.events.get_hook_stats(1)
+        assert len(stats) == 1
+        event_name, namespace, callback, calls, total, most = stats[0]
+        assert event_name == "profiled"
+        assert namespace == "test_profiling"
+        assert callback is self._dummy_func
+        assert calls == 2
+        assert 0 <= most <= total
+        self.events.reset_hook_stats()
+        assert not self.events.get_hook_stats()
+
+    def test_event_post(self):
+        """Test posting events to be fired later."""
+        fired = []
+        self.events.hook("posted", callback=lambda *args: fired.append(args))
+        self.events.post("posted", 1)
+        self.events.post("posted", 2)
+        self.events.post("posted", "a", coalesce_key="a")
+        self.events.post("posted", "b", coalesce_key="b")
+        self.events.post("posted", "a2", coalesce_key="a")
+        assert not fired
+        assert self.events.posted == 4
+        assert self.events.dispatch_posted() == 4
+        # Coalesced events keep their place, with the latest arguments.
+        assert fired == [(1,), (2,), ("a2",), ("b",)]
+        assert not self.events.posted
+        assert self.events.dispatch_posted() == 0
+
+    def test_event_post_from_hook(self):
+        """Test that events posted while dispatching wait for the next one."""
+        fired = []
+
+        def _repost(n):
+            fired.append(n)
+            self.events.post("reposted", n + 1)
+
+        self.events.hook("reposted", callback=_repost)
+        self.events.post("reposted", 1)
+        self.events.dispatch_posted()
+        assert fired == [1]
+        self.events.dispatch_posted()
+        assert fired == [1, 2]
+
+    def test_get_hooks(self):
+        """Test listing the hooks in a namespace."""
+        events = EventManager()
+        events.hook("one", "listed", callback=self._dummy_func)
+        events.hook("two", "listed", callback=self._dummy_func, pre=True)
+        events.hook("two", "other", callback=self._dummy_func)
+        hooks = events.get_hooks("listed")
+        assert [(name, hook.pre) for name, hook in hooks] == \
+            [("one", False), ("two", True)]
+        events.unhook("t*", "listed")
+        assert [name for name, hook in events.get_hooks("listed")] == ["one"]
+        events.unhook("*", callback=self._dummy_func)
+        assert not events.get_hooks("listed")
+        assert not events.get_hooks("other")
+        assert not events._namespaces
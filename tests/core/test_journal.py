@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Tests for the entity change journal."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from os.path import exists
+from shutil import rmtree
+
+import pytest
+
+from atria.core.entities import Entity, EntityManager
+from atria.core.journal import Journal
+from atria.core.pickle import PickleStore
+from atria.core.snapshots import SnapshotManager
+from atria.core.storage import DataStoreManager
+
+
+class JournalEntity(Entity):
+
+    """A test entity for journaling."""
+
+    _store = PickleStore("journal_entities")
+    _uid_code = "JE"
+
+
+ENTITIES = EntityManager()
+ENTITIES.register(JournalEntity)
+STORES = DataStoreManager()
+STORES.register("journal_entities", JournalEntity._store)
+
+
+@pytest.fixture
+def journal(request):
+    """Create a journal in a clean directory and close it afterwards."""
+    _journal = Journal("journal_test", entities=ENTITIES, stores=STORES)
+    if exists(_journal._path):
+        rmtree(_journal._path)
+
+    def _clean_up():
+        _journal.close()
+        rmtree(_journal._path)
+
+    request.addfinalizer(_clean_up)
+    return _journal
+
+
+class TestJournal:
+
+    """A collection of tests for the change journal."""
+
+    def test_journal_flush(self, journal):
+        """Test that changes are only recorded while a journal is open."""
+        entity = JournalEntity()
+        entity.dirty()
+        assert not journal.flush()
+        journal.open()
+        assert journal.is_open
+        entity.dirty()
+        entity.dirty()
+        # Changing an entity more than once in a pulse is one record.
+        assert journal.flush() == 1
+        assert not journal.flush()
+
+    def test_journal_replay(self, journal):
+        """Test that replaying a journal recovers unsaved changes."""
+        journal.open()
+        entity = JournalEntity()
+        entity.tags["test"] = "recovered"
+        gone = JournalEntity()
+        gone.save()
+        STORES.commit()
+        gone.delete()
+        journal.flush()
+        # Pretend the server crashed here, before anything was saved.
+        journal.close()
+        JournalEntity._store.abort()
+        assert not JournalEntity._store.has(entity.key)
+        assert JournalEntity._store.has(gone.key)
+        assert journal.replay() == 2
+        assert JournalEntity._store.get(entity.key)["tags"]["test"] == \
+            "recovered"
+        assert not JournalEntity._store.has(gone.key)
+        assert not journal._get_segments()
+
+    def test_journal_replay_order(self, journal):
+        """Test that the last change to an entity in a pulse wins."""
+        entity = JournalEntity()
+        entity.save()
+        STORES.commit()
+        journal.open()
+        entity.dirty()
+        entity.delete()
+        # It was put back with new data after being deleted.
+        entity.tags["test"] = "restored"
+        journal.flush()
+        journal.close()
+        JournalEntity._store.abort()
+        assert journal.replay() == 2
+        assert JournalEntity._store.get(entity.key)["tags"]["test"] == \
+            "restored"
+
+    def test_journal_replay_incomplete(self, journal):
+        """Test that a partially written batch is dropped on replay."""
+        journal.open()
+        first = JournalEntity()
+        first.dirty()
+        journal.flush()
+        second = JournalEntity()
+        second.dirty()
+        journal.flush()
+        journal._file.truncate(journal._file.tell() - 1)
+        journal.close()
+        JournalEntity._store.abort()
+        assert journal.replay() == 1
+        assert JournalEntity._store.has(first.key)
+        assert not JournalEntity._store.has(second.key)
+
+    def test_journal_truncate(self, journal):
+        """Test that saving a snapshot truncates the journal."""
+        snapshots = SnapshotManager(entities=ENTITIES, stores=STORES,
+                                    journal=journal)
+        journal.open()
+        entity = JournalEntity()
+        entity.dirty()
+        journal.flush()
+        assert len(journal._get_segments()) == 1
+        snapshots.save(background=False)
+        assert not entity.is_dirty
+        assert len(journal._get_segments()) == 1
+        journal.close()
+        assert journal.replay() == 0
+
+    def test_journal_open_adopts_segments(self, journal):
+        """Test that segments left by a reloaded process are discarded."""
+        old_journal = Journal("journal_test", entities=ENTITIES,
+                              stores=STORES)
+        old_journal.open()
+        JournalEntity().dirty()
+        old_journal.flush()
+        # The new process opens its journal without replaying.
+        old_file, old_journal._file = old_journal._file, None
+        old_file.close()
+        journal.open()
+        assert len(journal._get_segments()) == 2
+        journal.truncate()
+        assert len(journal._get_segments()) == 1
@@ -91,6 +91,11 @@ class TestClients:
         assert self.clients.find_by_port(0) is None
         assert self.clients.find_by_port(client.port) is client
 
+    def test_client_port_map(self):
+        """Test that we can get a mapping of clients by their ports."""
+        client = self.opened_clients[0]
+        assert self.clients.get_port_map() == {client.port: client}
+
     def test_read_from_client(self):
         """Test that we can read from a client."""
         self.client.write("ping".encode("ascii") + b"\n")
@@ -110,9 +115,12 @@ class TestClients:
 
     def test_client_disconnect(self):
         """Test that we can detect a client disconnect."""
+        port = self.opened_clients[0].port
         self.client.close()
         self.clients.poll()
         assert not self.opened_clients
+        assert self.clients.find_by_port(port) is None
+        assert not self.clients.get_port_map()
 
     def test_client_manager_close(self):
         """Test that we can close the listener socket."""
@@ -4,12 +4,14 @@
 # :copyright: (c) 2008 - 2016 Will Hutcheson
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
+from os import getpid
 from os.path import exists, join
 from shutil import rmtree
 
 import pytest
 
 from atria import settings
+from atria.core import pickle as pickle_module
 from atria.core.pickle import PickleStore
 
 
@@ -74,6 +76,17 @@ class TestPickleStores:
         self.store._put("test", self.data)
         assert exists(self.pickle_path)
 
+    def test_picklestore_put_temp_path(self, monkeypatch):
+        """Test that each process writes to its own temporary file."""
+        replaced = []
+        monkeypatch.setattr(pickle_module, "replace",
+                            lambda src, dst: replaced.append(src))
+        self.store._put("temp", self.data)
+        temp_path = join(self.store_path, "temp.pkl.{}.tmp".format(getpid()))
+        assert replaced == [temp_path]
+        assert exists(temp_path)
+        pickle_module.remove(temp_path)
+
     def test_picklestore_has(self):
         """Test that we can tell if this store has a key."""
         assert self.store._has("test")
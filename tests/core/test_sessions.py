@@ -7,8 +7,12 @@
 import pytest
 
 from atria import settings
+from atria.core import sessions as sessions_module
+from atria.core.accounts import Account
+from atria.core.characters import Character
 from atria.core.sessions import AlreadyExists, SessionManager
 from atria.core.shells import EchoShell
+from atria.libs.miniboa import strip_caret_codes
 
 
 class TestSessions:
@@ -26,6 +30,8 @@ class TestSessions:
             self.active = True
             self.address = "127.0.0.1"
             self.port = port
+            self.fileno = port
+            self.rows = 5
             self._idle = 0
             self._commands = []
             self._output = []
@@ -44,8 +50,10 @@ class TestSessions:
         def idle(self):
             return self._idle
 
-        def send_cc(self, output):
-            return self._output.append(output)
+        def send_raw(self, data):
+            # Turn the output back into text, to keep the tests readable.
+            text = data.decode("cp1252").replace("\r\n", "\n")
+            return self._output.append(text)
 
         # noinspection PyPep8Naming,PyDocstring
         class sock:
@@ -81,6 +89,30 @@ class TestSessions:
         """Test that we can find a session by its client."""
         assert self.sessions.find_by_client(self.client) is self.session
 
+    def test_session_find_by_fileno(self):
+        """Test that we can find a session by its client's fileno."""
+        assert self.sessions.find_by_fileno(self.client.fileno) is \
+            self.session
+        assert not self.sessions.find_by_fileno(-1)
+
+    def test_session_find_by_account_and_char(self):
+        """Test that we can find a session by its account or character."""
+        account = Account()
+        char = Character()
+        assert not self.sessions.find_by_account(account)
+        self.session.account = account
+        self.session.char = char
+        assert self.sessions.find_by_account(account) is self.session
+        assert self.sessions.find_by_char(char) is self.session
+        other_char = Character()
+        self.session.char = other_char
+        assert not self.sessions.find_by_char(char)
+        assert self.sessions.find_by_char(other_char) is self.session
+        self.session.char = None
+        self.session.account = None
+        assert not self.sessions.find_by_account(account)
+        assert not self.sessions.find_by_char(other_char)
+
     def test_session_active(self):
         """Test that we can determine if a session should be closed."""
         assert self.session.active
@@ -136,6 +168,75 @@ class TestSessions:
         assert self.session._output_queue.popleft() == "\n\\t\\10\\8\\2014\r\n"
         assert not self.session._output_queue
 
+    def test_session_wrap_to_width(self):
+        """Test wrapping text to a session's width."""
+        wrap = self.session.wrap_to_width
+        assert wrap("short", 10) == ["short"]
+        assert wrap("ab cd efgh", 5) == ["ab cd", "efgh"]
+        # Lines with no spaces are broken without losing any characters.
+        assert wrap("abcdefghij^Rklm", 5) == ["abcde", "fghij^R", "klm"]
+        # Formatting codes don't count towards the width, but ^^ does.
+        assert wrap("^Rabc^^de fghij klm", 6) == \
+            ["^Rabc^^de", "fghij", "klm"]
+        assert wrap("^Rabc^^de fghij", 6, parse_codes=False) == \
+            ["^Rabc^", "^de", "fghij"]
+        # The width is kept for every line, not just the first.
+        assert wrap("one two three four five", 9) == \
+            ["one two", "three", "four five"]
+        # Very long text doesn't hit the recursion limit.
+        assert len(wrap("word " * 20000, 80)) == 1250
+
+    def test_session_render(self):
+        """Test rendering output chunks into bytes to send."""
+        render = sessions_module._render_output
+        assert render([], 80, False) == b""
+        assert render(["^Rhello ", "there\n", "\n"], 80, True) == \
+            b"\x1b[1;31mhello there\r\n\r\n"
+        # Lines are wrapped after being put back together.
+        assert render(["ab c", "d efgh\nij"], 5, False) == \
+            b"ab cd\r\nefgh\r\nij"
+        # Rendered chunks end any line in progress and are left as they are.
+        assert render(["one", b"^R\r\n", "two\n"], 80, False) == \
+            b"one^R\r\ntwo\r\n"
+        assert self.session.render("^^caret\n", width=3) == \
+            b"^ca\r\nret\r\n"
+
+    def test_session_page(self):
+        """Test that long output is sent a screen at a time."""
+        generated = []
+
+        def _lines():
+            for n in range(20):
+                generated.append(n)
+                yield "Line {}".format(n)
+
+        queue = self.session._output_queue
+        shell = self.session.shell
+        self.session.shell = EchoShell
+        self.session.page(_lines())
+        # The screen is five rows, one of which is for the prompt.
+        assert queue.popleft() == "Line 0\nLine 1\nLine 2\nLine 3\n"
+        assert len(generated) == 5
+        assert "Enter" in self.session._get_prompt()
+        self.session._parse_input("")
+        assert queue.popleft() == "Line 4\nLine 5\nLine 6\nLine 7\n"
+        self.session._parse_input("q")
+        assert not queue
+        assert self.session._get_prompt() == self.session.shell.get_prompt()
+        # Anything other than enter or quit ends paging and is handled
+        # like normal input.
+        self.session.page("One\nTwo\nThree\nFour\nFive")
+        queue.clear()
+        self.session._parse_input("test")
+        assert queue.popleft() == "You sent: test\n"
+        assert not self.session._pager
+        # Short output just gets sent.
+        self.session.page("Short")
+        assert queue.popleft() == "Short\n"
+        assert not self.session._pager
+        self.session.shell = shell
+        assert len(generated) == 9
+
     def test_session_parse_input(self):
         """Test that a session can parse input."""
         self.session._parse_input("test")
@@ -160,16 +261,17 @@ class TestSessions:
         assert self.client.cmd_ready
         self.session.poll()
         assert not self.client.cmd_ready
-        assert self.client._output.pop(0) == "You sent: test\n"
-        assert self.client._output.pop(0) == "\n" + self.prompt
+        # The output and the prompt are sent together.
+        assert self.client._output.pop(0) == \
+            "You sent: test\n\n" + strip_caret_codes(self.prompt)
         assert not self.client._output
 
     def test_session_poll_no_command(self):
         """Test that sending to a session with no input sends a newline."""
         self.session.send("Hello!")
         self.session.poll()
-        assert self.client._output.pop(0) == "\nHello!\n"
-        assert self.client._output.pop(0) == "\n" + self.prompt
+        assert self.client._output.pop(0) == \
+            "\nHello!\n\n" + strip_caret_codes(self.prompt)
         assert not self.client._output
 
     def test_session_check_idle(self):
@@ -198,6 +300,166 @@ class TestSessions:
         assert (self.session._output_queue.popleft() ==
                 "^RDisconnecting due to inactivity. Goodbye!^~\n")
 
+    def test_session_manager_idle_deadlines(self, monkeypatch):
+        """Test that sessions are only checked for idling when they're due."""
+        started = sessions_module.now()
+        monkeypatch.setattr(sessions_module, "now", lambda: started)
+        sessions = SessionManager()
+        client = self._FakeClient(50020)
+        session = sessions.create(client, EchoShell)
+        assert len(sessions._idle_deadlines) == 1
+        # Nothing happens before the deadline, even if they're idle.
+        client._idle = settings.IDLE_TIME
+        sessions.check_idle()
+        assert "idle" not in session.flags
+        # They've gone idle, and are checked again at the max idle time.
+        monkeypatch.setattr(sessions_module, "now",
+                            lambda: started + settings.IDLE_TIME)
+        sessions.check_idle()
+        assert "idle" in session.flags
+        assert session._idle_deadline == started + settings.IDLE_TIME_MAX
+        # They came back, and are rescheduled from their last input when
+        # that deadline passes.
+        client._idle = 0
+        client._commands.append("test")
+        session.wake()
+        sessions.poll()
+        assert "idle" not in session.flags
+        monkeypatch.setattr(sessions_module, "now",
+                            lambda: started + settings.IDLE_TIME_MAX)
+        sessions.check_idle()
+        assert "idle" not in session.flags
+        assert session._idle_deadline == (started + settings.IDLE_TIME_MAX +
+                                          settings.IDLE_TIME)
+        # Stale deadlines were dropped along the way.
+        assert len(sessions._idle_deadlines) == 1
+
+    def test_session_poll_skips_idle_check(self, monkeypatch):
+        """Test that polling a session doesn't check whether it's idle."""
+        sessions = SessionManager()
+        session = sessions.create(self._FakeClient(50021), EchoShell)
+        checked = []
+        monkeypatch.setattr(session, "_check_idle",
+                            lambda: checked.append(session))
+        # A waiting session stays active with its input queued.
+        session._client._commands.append("test")
+        session.wait(5)
+        sessions.poll()
+        sessions.poll()
+        assert session.port in sessions._active
+        assert session._client.cmd_ready
+        assert not checked
+
+    def test_session_manager_broadcast(self):
+        """Test that broadcasts are rendered once for each color and width."""
+        sessions = SessionManager()
+        plain, same, colored, narrow = [
+            sessions.create(self._FakeClient(port))
+            for port in range(50001, 50005)]
+        colored.color = True
+        narrow.width = 6
+        sessions.broadcast("^Rhello there", sessions.all())
+        assert plain._output_queue[0] == b"hello there\r\n"
+        assert same._output_queue[0] is plain._output_queue[0]
+        assert colored._output_queue[0] == b"\x1b[1;31mhello there\r\n"
+        assert narrow._output_queue[0] == b"hello\r\nthere\r\n"
+        # Rendered output is sent as is, in order with everything else.
+        plain.send("after")
+        plain.poll(output_only=True)
+        assert plain._client._output == ["\nhello there\nafter\n\n> "]
+
+    def test_session_manager_active(self, monkeypatch):
+        """Test that only sessions with something to do are polled."""
+        monkeypatch.setattr(settings, "COMMANDS_PER_PULSE", 1)
+        sessions = SessionManager()
+        session = sessions.create(self._FakeClient(50010), EchoShell)
+        assert session.port in sessions._active
+        sessions.poll()
+        assert session.port not in sessions._active
+        session._client._output.clear()
+        # Input isn't seen until something wakes the session.
+        session._client._commands.append("test")
+        sessions.poll()
+        assert not session._client._output
+        session.wake()
+        sessions.poll()
+        assert session._client._output.pop(0) == "You sent: test\n\n> "
+        assert session.port not in sessions._active
+        session._client._output.clear()
+        # Sessions wake themselves when they have output.
+        session.send("Hello.")
+        assert session.port in sessions._active
+        sessions.poll()
+        assert session._client._output.pop(0) == "\nHello.\n\n> "
+        # Sessions with more input than they can run in a pulse stay awake.
+        session._client._commands.extend(["one", "two"])
+        session.wake()
+        sessions.poll()
+        assert session.port in sessions._active
+        sessions.poll()
+        assert session.port not in sessions._active
+
+    def test_session_manager_command_budget(self, monkeypatch):
+        """Test that sessions run commands as fast as their lag allows."""
+        monkeypatch.setattr(settings, "COMMANDS_PER_PULSE", 2)
+        sessions = SessionManager()
+        session = sessions.create(self._FakeClient(50040), EchoShell)
+        sessions.poll()
+        session._client._output.clear()
+        session._client._commands.extend(["one", "two", "three"])
+        session.wake()
+        sessions.poll()
+        # Everything they ran in the pulse gets one prompt.
+        assert session._client._output.pop(0) == \
+            "You sent: one\nYou sent: two\n\n> "
+        # A wait state holds their input until it's over.
+        session.wait(2)
+        assert session.waiting
+        sessions.poll()
+        assert not session._client._output
+        assert session.port in sessions._active
+        sessions.poll()
+        assert not session.waiting
+        assert session._client._output.pop(0) == "You sent: three\n\n> "
+        assert session.port not in sessions._active
+
+    def test_session_manager_output_budget(self, monkeypatch):
+        """Test that output over a session's budget waits for later polls."""
+        monkeypatch.setattr(settings, "OUTPUT_CHARS_PER_PULSE", 10)
+        monkeypatch.setattr(settings, "OUTPUT_CHUNKS_PER_PULSE", 3)
+        sessions = SessionManager()
+        spammed, quiet = [sessions.create(self._FakeClient(port), EchoShell)
+                          for port in (50030, 50031)]
+        sessions.poll()
+        spammed._client._output.clear()
+        quiet._client._output.clear()
+        # Five short sends go over the chunk budget.
+        for n in range(5):
+            spammed.send(str(n))
+        quiet.send("Hello.")
+        sessions.poll()
+        assert spammed._client._output == ["\n0\n1\n2\n"]
+        assert quiet._client._output == ["\nHello.\n\n> "]
+        assert sessions.stats["deferred"] == 1
+        # They were moved to the back of the line.
+        assert list(sessions._active) == [spammed.port]
+        spammed._client._output.clear()
+        # The rest comes without another newline first, and then a prompt.
+        sessions.poll()
+        assert spammed._client._output == ["3\n4\n\n> "]
+        assert sessions.stats["deferred"] == 0
+        assert sessions.stats["deferred_total"] == 1
+        spammed._client._output.clear()
+        # One long send goes over the byte budget, but still gets sent.
+        spammed.send("x" * 20)
+        spammed.send("y")
+        sessions.poll()
+        assert spammed._client._output == ["\n" + "x" * 20 + "\n"]
+        spammed._client._output.clear()
+        sessions.poll()
+        assert spammed._client._output == ["y\n\n> "]
+        assert not sessions._active
+
     def test_session_manager_poll(self):
         """Test that we can poll a session manager to poll all its sessions."""
         # Create a couple more sessions to test with.
@@ -217,8 +479,8 @@ class TestSessions:
         assert "closed" in sessions[0].flags
         # The second session should have been parsed and output returned.
         assert not sessions[1]._client.cmd_ready
-        assert sessions[1]._client._output.pop(0) == "You sent: test\n"
-        assert sessions[1]._client._output.pop(0) == "\n" + self.prompt
+        assert sessions[1]._client._output.pop(0) == \
+            "You sent: test\n\n" + strip_caret_codes(self.prompt)
         assert not sessions[1]._client._output
         assert sessions[1].active
         # And the third session didn't do anything, so should be unchanged.
@@ -240,5 +502,10 @@ class TestSessions:
     def test_session_manager_prune(self):
         """Test that we can prune the dead sessions from a session manager."""
         assert len(self.sessions._sessions) == 3
+        # Only the sessions that closed on their last poll are looked at.
+        assert len(self.sessions._closed) == 2
         self.sessions.prune()
+        assert not self.sessions._closed
         assert len(self.sessions._sessions) == 1
+        assert len(self.sessions._clients) == 1
+        assert len(self.sessions._filenos) == 1
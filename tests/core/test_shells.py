@@ -6,7 +6,8 @@
 
 import pytest
 
-from atria.core.shells import AlreadyExists, Command, Shell, ShellManager
+from atria.core.shells import (_VerbTable, AlreadyExists, Command, COMMANDS,
+                               Shell, ShellManager)
 from atria.core.utils.funcs import joins
 
 
@@ -180,6 +181,30 @@ class TestShells:
         assert not self.shell.get_command("beep")
         assert self.shell.find_command("beep") is self.TestCommand
 
+    def test_shell_find_command_resolved(self):
+        """Test that resolved verbs are forgotten when the lineage changes."""
+
+        class ParentShell(Shell):
+            pass
+
+        class ChildShell(ParentShell):
+            pass
+
+        ParentShell.add_verbs(self.AnotherCommand, "boop")
+        assert ChildShell.find_command("boo") is self.AnotherCommand
+        assert ChildShell._resolved["boo"] is self.AnotherCommand
+        assert not ChildShell.find_command("zap")
+        # Adding verbs anywhere in the lineage is seen by its children.
+        ChildShell.add_verbs(self.TestCommand, "bonk")
+        ParentShell.add_verbs(self.TestCommand, "zap")
+        assert ChildShell.find_command("zap") is self.TestCommand
+        assert ChildShell.find_command("bo") is self.TestCommand
+        # As is changing which comes first.
+        ChildShell.parent_first = True
+        assert ChildShell.find_command("bo") is self.AnotherCommand
+        ParentShell.remove_verbs("boop")
+        assert ChildShell.find_command("bo") is self.TestCommand
+
     def test_shell_remove_verbs(self):
         """Test that we can remove verbs from a shell's verb store."""
         self.shell.remove_verbs("toot")
@@ -191,6 +216,35 @@ class TestShells:
         self.shell.remove_verbs("test", "!", "nope")
         assert not self.shell._verbs
 
+    def test_shell_verb_table(self):
+        """Test that abbreviations resolve the same as when all were stored."""
+        table = _VerbTable()
+        table.add("look", self.TestCommand)
+        table.add("loot", self.AnotherCommand)
+        table.add("list", self.AnotherCommand, truncate=False)
+        # The first command registered gets the shared abbreviations.
+        for verb in ("loo", "lo", "l"):
+            assert table[verb] is self.TestCommand
+        assert table["loot"] is self.AnotherCommand
+        assert "lis" not in table
+        assert "" not in table
+        assert table.has_verb("look") and not table.has_verb("lo")
+        # Removing a verb takes its abbreviations with it, and they aren't
+        # handed down to other verbs that start with them.
+        table.remove("look")
+        for verb in ("look", "loo", "lo", "l"):
+            assert verb not in table
+        assert table["loot"] is self.AnotherCommand
+        # Until another verb that starts with them is added.
+        table.add("lot", self.AnotherCommand)
+        assert table["lo"] is self.AnotherCommand
+        assert "loo" not in table
+        table.remove("lo")
+        for verb in ("lo", "l"):
+            assert verb not in table
+        assert table["lot"] is self.AnotherCommand
+        assert len(table) == 3
+
     def test_shell_one_argument(self):
         """Test that we can break off one argument from some client input."""
         assert (self.shell._one_argument("this is 'a test'") ==
@@ -220,6 +274,21 @@ class TestShells:
                 ["this", "is", "a test"])
         assert (self.shell._get_arguments("test test test", max_args=0) ==
                 ["test test test"])
+        # Empty delimited strings don't count towards the max.
+        assert (self.shell._get_arguments("'' a '' b c", max_args=2) ==
+                ["a", "b", " c"])
+
+    def test_shell_get_arguments_paired_delimiters(self):
+        """Test parsing arguments with different opening and closing pairs."""
+
+        class BracketShell(Shell):
+            delimiters = ("([", ")]")
+
+        assert (BracketShell._get_arguments("say (hello there) [a b") ==
+                ["say", "hello there", "a b"])
+        # Only opening delimiters end an undelimited argument.
+        assert BracketShell._get_arguments("x(y)z) ()") == ["x", "y", "z)"]
+        assert BracketShell._one_argument(" () [a] b") == ("a", " b")
 
     def test_shell_parse(self):
         """Test that we can parse client input."""
@@ -237,3 +306,13 @@ class TestShells:
             self.shell.parse("test")
         with pytest.raises(NotImplementedError):
             self.shell.parse("!bloop")
+
+    def test_shell_parse_records_timing(self):
+        """Test that parsing records how long commands take, even failing."""
+        COMMANDS.reset_command_stats()
+        with pytest.raises(NotImplementedError):
+            self.shell.parse("test")
+        self.shell.parse("nope")
+        stats = COMMANDS.get_command_stats()
+        assert [stat[:2] for stat in stats] == [(self.TestCommand, 1)]
+        COMMANDS.reset_command_stats()
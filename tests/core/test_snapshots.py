@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Tests for saving snapshots of the game state."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+import os
+
+import pytest
+
+from atria.core.entities import Entity, EntityManager
+from atria.core.pickle import PickleStore
+from atria.core.snapshots import SnapshotManager
+from atria.core.storage import DataStoreManager
+
+
+class SnapshotEntity(Entity):
+
+    """A test entity for snapshots."""
+
+    _store = PickleStore("snapshot_entities")
+    _uid_code = "SN"
+
+
+class TestSnapshots:
+
+    """A collection of tests for snapshots."""
+
+    entities = EntityManager()
+    stores = DataStoreManager()
+    snapshots = SnapshotManager(entities=entities, stores=stores)
+
+    @classmethod
+    def setup_class(cls):
+        """Register our test entity and its store."""
+        cls.entities.register(SnapshotEntity)
+        cls.stores.register("snapshot_entities", SnapshotEntity._store)
+
+    def test_snapshot_foreground(self):
+        """Test that a foreground snapshot saves and commits entities."""
+        entity = SnapshotEntity()
+        entity.dirty()
+        assert entity in self.entities.get_dirty()
+        assert self.snapshots.save(background=False)
+        assert not entity.is_dirty
+        assert not SnapshotEntity._store.pending
+        assert SnapshotEntity._store._has(entity.key)
+        assert not self.snapshots.in_progress
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+    def test_snapshot_background(self):
+        """Test that a background snapshot saves from a child process."""
+        entity = SnapshotEntity()
+        entity.dirty()
+        assert self.snapshots.save(background=True)
+        assert self.snapshots.in_progress
+        # The parent doesn't clear anything until the child finishes.
+        assert entity.is_dirty
+        # Only one background snapshot can run at a time.
+        assert not self.snapshots.save(background=True)
+        self.snapshots.wait()
+        assert not self.snapshots.in_progress
+        assert not entity.is_dirty
+        assert not SnapshotEntity._store.pending
+        assert SnapshotEntity._store._has(entity.key)
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+    def test_snapshot_background_changed(self):
+        """Test that entities changed during a snapshot stay dirty."""
+        entity = SnapshotEntity()
+        entity.dirty()
+        self.snapshots.save(background=True)
+        entity.dirty()
+        self.snapshots.wait()
+        assert entity.is_dirty
+        self.snapshots.save(background=False)
+        assert not entity.is_dirty
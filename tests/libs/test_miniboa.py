@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Tests for the Telnet server library."""
+# Part of Atria MUD Server (https://github.com/whutch/atria)
+# :copyright: (c) 2008 - 2016 Will Hutcheson
+# :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
+
+from itertools import product
+
+from atria.libs.miniboa import ANSI_CODES, colorize, strip_caret_codes
+
+
+def _replace_codes(text, ansi):
+    """Render caret codes the old way, one token at a time."""
+    text = text.replace("^^", "\x00")
+    for token, code in ANSI_CODES.items():
+        text = text.replace(token, code if ansi else "")
+    return text.replace("\x00", "^")
+
+
+class TestCaretCodes:
+
+    """A collection of tests for rendering caret codes."""
+
+    def test_colorize(self):
+        """Test replacing caret codes with ANSI sequences."""
+        assert colorize("plain") == "plain"
+        assert colorize("^Rred^~") == "\x1b[1;31mred\x1b[0m"
+        assert colorize("^^R and ^x") == "^R and ^x"
+
+    def test_strip_caret_codes(self):
+        """Test stripping caret codes out of a string."""
+        assert strip_caret_codes("^Rred^~") == "red"
+        assert colorize("^Rred^~", ansi=False) == "red"
+        assert strip_caret_codes("^^^R^^") == "^^"
+
+    def test_same_as_replacing(self):
+        """Test that rendering matches replacing each token in turn."""
+        for chars in product("^Rx~", repeat=5):
+            text = "".join(chars)
+            assert colorize(text) == _replace_codes(text, True)
+            assert strip_caret_codes(text) == _replace_codes(text, False)
@@ -5,10 +5,12 @@
 # :license: MIT (https://github.com/whutch/atria/blob/master/LICENSE.txt)
 
 from importlib import reload
+from multiprocessing import Value
 
 import pytest
 import redis
 
+from atria.core.const import PHASE_TIMERS
 import atria.nanny as nanny
 
 
@@ -57,3 +59,19 @@ class TestMain:
         nanny.start_nanny()
         worker.stop()
         reload(nanny)
+
+
+def test_check_stall():
+    """Test that a stalled server process heartbeat can be detected."""
+    server = nanny.ServerProcess()
+    server._heartbeat = Value("L", 0, lock=False)
+    server._phase = Value("i", PHASE_TIMERS, lock=False)
+    # A process that hasn't started beating is still booting.
+    assert server.check_stall(100) == 0
+    assert server.check_stall(200) == 0
+    server._heartbeat.value += 1
+    assert server.check_stall(200) == 0
+    assert server.check_stall(205) == 5
+    assert server.phase == "timers"
+    server._heartbeat.value += 1
+    assert server.check_stall(206) == 0